@@ -0,0 +1,514 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import multiprocessing
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+from cianparser.backends import PARSER_BACKENDS, make_document
+from cianparser.constants import COUNT_OF_OFFERS_PER_PAGE, FIELDS_OF_OFFER, LATIN_FIELDS, MAX_COUNT_OF_PAGES
+from cianparser.json_state import extract_offers_state
+from cianparser.helpers import transliterate_to_latin
+from cianparser.offer import RentLongOffer
+from cianparser.parser import ParserOffersAuto
+from cianparser.rate_limiter import RateLimiter
+from cianparser.sharding import SHARD_CAPACITY, plan_shards
+from cianparser.sinks import CsvSink, LatinSink, SqliteSink
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+FIXTURES_DIR = pathlib.Path(__file__).parent / 'fixtures'
+COUNTS_OF_OFFERS = [100, 200, 400, 800]
+COUNT_OF_SQLITE_OFFERS = 50000
+COUNT_OF_MEMORY_OFFERS = 100000
+COUNT_OF_LATIN_OFFERS = 20000
+BENCH_ROUNDS = 5
+MIN_ROUND_SECONDS = 0.2
+REGRESSION_TOLERANCE = 0.1
+IMPORT_TIME_BUDGET_MS = 100
+# count of found offers reported by listing fixtures, the others do not report it
+COUNTS_OF_FOUND_OFFERS = {'listing_sale_moscow_count.html': 1131}
+COUNT_OF_PLANNED_OFFERS = 20000
+COUNT_OF_SINGLE_PRICE_OFFERS = 3000
+LAZY_MODULES = ('cloudscraper', 'requests', 'bs4', 'transliterate', 'aiohttp', 'lxml', 'selectolax', 'pyarrow')
+OFFER = {
+    'author': 'Apple Real Estate',
+    'author_type': 'real_estate_agent',
+    'link': 'https://www.cian.ru/rent/flat/282487326/',
+    'city': 'Москва',
+    'deal_type': 'rent',
+    'accommodation_type': 'flat',
+    'floor': 5,
+    'floors_count': 12,
+    'rooms_count': 3,
+    'total_meters': 85.0,
+    'price_per_month': 93000,
+    'commissions': 50,
+    'price_per_m2': 1094,
+    'year_of_construction': 1954,
+    'living_meters': 55.0,
+    'kitchen_meters': 11.0,
+    'phone': '+79057145354',
+    'address': 'Замоскворечье, Космодамианская набережная',
+}
+
+
+def create_parser(deal_type='sale', parser_backend='bs4', is_express_mode=True, data_dir_path=None, end_page=1):
+    return ParserOffersAuto(
+        deal_type=deal_type,
+        accommodation_type='flat',
+        city_name='Казань',
+        location_id='4777',
+        rooms='all',
+        start_page=1,
+        end_page=end_page,
+        is_express_mode=is_express_mode,
+        data_dir_path=data_dir_path or pathlib.Path(tempfile.gettempdir()),
+        rate_limiter=RateLimiter(requests_per_second=0),
+        parser_backend=parser_backend,
+    )
+
+
+def parse_listing_fixture(path, parser_backend, html=None):
+    parser = create_parser('rent_long' if 'rent' in path.name else 'sale', parser_backend)
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser._parse_page(html or path.read_text(), number_page=1, count_of_pages=1, attempt_number=0)
+    return parser.get_results()
+
+
+def parse_offer_fixture(path, parser_backend):
+    return create_parser(parser_backend=parser_backend)._define_page_data(path.read_text())
+
+
+def check_parser_backends():
+    """Every parser backend must give the same records as BeautifulSoup on all fixtures."""
+    for path in sorted(FIXTURES_DIR.glob('*.html')):
+        parse = parse_listing_fixture if path.name.startswith('listing') else parse_offer_fixture
+        expected = parse(path, 'bs4')
+        for parser_backend in PARSER_BACKENDS:
+            result = parse(path, parser_backend)
+            status = 'ok' if result == expected else 'MISMATCH'
+            print(f"{path.name:>32} | {parser_backend:>10} | {status}")
+            if result != expected:
+                raise AssertionError(f'{parser_backend} differs from bs4 on {path.name}:\n{result}\n{expected}')
+
+
+def check_json_state():
+    """Cards filled from the json state must agree with the same cards parsed from html without the state."""
+    for path in listing_fixtures():
+        html = path.read_text()
+        if not extract_offers_state(html):
+            continue
+        html_without_state = html[:html.find('<script>window._cianConfig')] + '</body></html>\n'
+        for parser_backend in PARSER_BACKENDS:
+            records = parse_listing_fixture(path, parser_backend)
+            expected = parse_listing_fixture(path, parser_backend, html_without_state)
+            fields = ('link', 'price', 'total_meters', 'floor', 'floors_count', 'rooms_count', 'price_per_m2')
+            mismatches = [(record['link'], field) for record, expected_record in zip(records, expected)
+                          for field in fields if record.get(field) != expected_record.get(field)]
+            status = 'ok' if len(records) == len(expected) and not mismatches else 'MISMATCH'
+            print(f"{path.name:>32} | {parser_backend:>10} | json state {status}")
+            if status != 'ok':
+                raise AssertionError(f'json state differs from html on {path.name}: {mismatches[:5]}')
+
+
+def check_count_of_offers():
+    """The first listing page must size the crawl by the count of found offers of the query only: from the results
+    of the json state or, without the state, from the header; counts elsewhere on the page must be ignored.
+    """
+    for path in listing_fixtures():
+        html = path.read_text()
+        expected = COUNTS_OF_FOUND_OFFERS.get(path.name, -1)
+        html_without_state = html[:html.find('<script>window._cianConfig')] + '</body></html>\n'
+        for parser_backend in PARSER_BACKENDS:
+            counts = []
+            for page in (html, html_without_state):
+                parser = create_parser('rent_long' if 'rent' in path.name else 'sale', parser_backend, end_page=100)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    parser._select_offers(page, number_page=1)
+                counts.append((parser.count_of_offers, parser.last_page))
+            expected_last_page = min(math.ceil(expected / COUNT_OF_OFFERS_PER_PAGE), MAX_COUNT_OF_PAGES) if expected > 0 else 100
+            status = 'ok' if counts == [(expected, expected_last_page)] * 2 else 'MISMATCH'
+            print(f"{path.name:>32} | {parser_backend:>10} | count of offers {status}")
+            if status != 'ok':
+                raise AssertionError(f'count of offers and last page of {path.name} are {counts}, '
+                                     f'expected {(expected, expected_last_page)}')
+
+
+def check_plan_shards():
+    """plan_shards must split a large query into shards, which fit into the pages shown by cian, and keep all
+    of its offers; a query with cards but without their count must not be split.
+    """
+    html = (FIXTURES_DIR / 'listing_sale_moscow_count.html').read_text()
+    offers = [(int(10 ** (6 + 2.5 * ind / COUNT_OF_PLANNED_OFFERS)), 20 + ind % 1000 / 10)
+              for ind in range(COUNT_OF_PLANNED_OFFERS)]
+    # offers of a single price are split by fractional total area, some of them exactly on whole numbers
+    offers += [(5000000, 30 + ind * 0.37 % 90) for ind in range(COUNT_OF_SINGLE_PRICE_OFFERS)]
+
+    def is_in_band(offer, query):
+        price, area = offer
+        return (int(query.get('minprice', 0)) <= price <= int(query.get('maxprice', 10 ** 12)) and
+                float(query.get('mintarea', 0)) <= area <= float(query.get('maxtarea', 10 ** 6)))
+
+    def get(url, is_page_offer=False):
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(url).query))
+        count_of_offers = sum(1 for offer in offers if is_in_band(offer, query))
+        return html.replace('"aggregatedOffers": 1131', f'"aggregatedOffers": {count_of_offers}')
+
+    parser = create_parser()
+    parser._get = get
+    with contextlib.redirect_stdout(io.StringIO()):
+        shards = plan_shards(parser)
+    queries = [dict(urllib.parse.parse_qsl(shard.url_parameters().lstrip('&'))) for shard in shards]
+    lost_offers = [offer for offer in offers if not any(is_in_band(offer, query) for query in queries)]
+    counts = [shard.count_of_offers for shard in shards]
+    print(f"plan_shards: {len(offers)} offers are split into {len(shards)} shards "
+          f"({sum(1 for query in queries if 'maxtarea' in query or 'mintarea' in query)} by total area), "
+          f"the largest has {max(counts)} offers, {len(lost_offers)} offers are lost")
+    if lost_offers or max(counts) > SHARD_CAPACITY:
+        raise AssertionError(f'plan_shards gives shards with {counts} offers and loses {lost_offers[:5]}')
+
+    parser = create_parser()
+    parser._get = lambda url, is_page_offer=False: (FIXTURES_DIR / 'listing_sale_kazan.html').read_text()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan_shards(parser)
+    except Exception as exc:
+        print(f"plan_shards without count of offers: {exc}")
+    else:
+        raise AssertionError('plan_shards splits a query without count of offers')
+
+
+def check_import_time():
+    """Cold `import cianparser` must fit into IMPORT_TIME_BUDGET_MS and must not load heavy dependencies."""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import sys, cianparser; print(" ".join(sys.modules))'],
+        capture_output=True, text=True, check=True, cwd=pathlib.Path(__file__).parent,
+    )
+    import_time_ms = None
+    for line in completed.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == 'cianparser':
+            import_time_ms = int(parts[1]) / 1000
+
+    loaded_modules = set(completed.stdout.split()) & set(LAZY_MODULES)
+    print(f"import cianparser: {import_time_ms:.1f} ms (budget {IMPORT_TIME_BUDGET_MS} ms)")
+    if loaded_modules:
+        raise AssertionError(f'import cianparser loads {", ".join(sorted(loaded_modules))}')
+    if import_time_ms > IMPORT_TIME_BUDGET_MS:
+        raise AssertionError(f'import cianparser takes {import_time_ms:.1f} ms, budget is {IMPORT_TIME_BUDGET_MS} ms')
+
+
+def listing_fixtures():
+    return sorted(FIXTURES_DIR.glob('listing_*.html'))
+
+
+def offer_fixtures():
+    return sorted(FIXTURES_DIR.glob('offer_*.html'))
+
+
+def bench_parse_page(parser_backend):
+    pages = [(create_parser('rent_long' if 'rent' in path.name else 'sale', parser_backend), path.read_text())
+             for path in listing_fixtures()]
+
+    def run():
+        count_of_cards = 0
+        for parser, html in pages:
+            parser.result, parser.result_parsed = [], set()
+            parser._parse_page(html, number_page=1, count_of_pages=1, attempt_number=0)
+            count_of_cards += len(parser.result)
+        return count_of_cards
+    return run
+
+
+def bench_parse_block(parser_backend):
+    pages = []
+    for path in listing_fixtures():
+        parser = create_parser('rent_long' if 'rent' in path.name else 'sale', parser_backend)
+        offers = parser._select_offers(path.read_text(), number_page=1)
+        pages.append((parser, offers))
+
+    def run():
+        count_of_cards = 0
+        for parser, offers in pages:
+            parser.result_parsed = set()
+            for block in offers:
+                count_of_cards += parser._parse_block(block) is not None
+        return count_of_cards
+    return run
+
+
+def bench_offer_extractor(extractor_name, parser_backend):
+    parser = create_parser(parser_backend=parser_backend)
+    htmls = [path.read_text() for path in offer_fixtures()]
+    extractor = getattr(parser, extractor_name)
+
+    def run():
+        for html in htmls:
+            extractor(html, make_document(html, parser_backend))
+        return len(htmls)
+    return run
+
+
+def bench_define_page_data(parser_backend):
+    parser = create_parser(parser_backend=parser_backend)
+    offers = []
+    for path in offer_fixtures():
+        html = path.read_text()
+        offers.append((html, next(iter(extract_offers_state(html)), None)))
+
+    def run():
+        for html, offer_id in offers:
+            parser._define_page_data(html, offer_id)
+        return len(offers)
+    return run
+
+
+EXTRACTORS = {
+    '_parse_page': ('cards', bench_parse_page),
+    '_parse_block': ('cards', bench_parse_block),
+    '_parse_page_offer': ('offer pages', lambda backend: bench_offer_extractor('_parse_page_offer', backend)),
+    '_parse_page_offer_json': ('offer pages', lambda backend: bench_offer_extractor('_parse_page_offer_json', backend)),
+    '_define_page_data': ('offer pages', bench_define_page_data),
+}
+
+
+def peak_rss_mb():
+    """Peak rss of the current process, None where the resource module is not available."""
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 1024 / 1024 if sys.platform == 'darwin' else peak_rss / 1024
+
+
+def bench_extractor(extractor_name, parser_backend):
+    """Run extractor over fixtures in BENCH_ROUNDS rounds, return items per second of the best round and peak rss."""
+    per_second = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = EXTRACTORS[extractor_name][1](parser_backend)
+        run()
+        for _ in range(BENCH_ROUNDS):
+            count_of_items = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < MIN_ROUND_SECONDS:
+                count_of_items += run()
+            per_second = max(per_second, count_of_items / (time.perf_counter() - start))
+    return {'per_second': per_second, 'peak_rss_mb': peak_rss_mb()}
+
+
+def bench_extractors():
+    """Every extractor is measured in its own spawned child process, peak_rss_mb is the peak rss of that child.
+
+    Children are spawned instead of forked, so their rss does not include the memory of this process.
+    """
+    results = dict()
+    context = multiprocessing.get_context('spawn')
+    print(f"{'extractor':>24} | {'backend':>10} | {'items':>11} | {'per second':>10} | {'child peak rss MB':>17}")
+    for extractor_name, (items, _) in EXTRACTORS.items():
+        for parser_backend in PARSER_BACKENDS:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(bench_extractor, extractor_name, parser_backend).result()
+            results[f'{extractor_name}[{parser_backend}]'] = result
+            peak_rss = 'n/a' if result['peak_rss_mb'] is None else f"{result['peak_rss_mb']:.1f}"
+            print(f"{extractor_name:>24} | {parser_backend:>10} | {items:>11} | "
+                  f"{result['per_second']:>10.1f} | {peak_rss:>17}")
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Print change of speed against baseline, return names of extractors slower by more than tolerance."""
+    regressions = []
+    print(f"{'extractor':>37} | {'baseline/s':>10} | {'current/s':>10} | {'change':>7}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = result['per_second'] / baseline[name]['per_second'] - 1
+        status = ''
+        if change < -tolerance:
+            regressions.append(name)
+            status = ' REGRESSION'
+        print(f"{name:>37} | {baseline[name]['per_second']:>10.1f} | {result['per_second']:>10.1f} | "
+              f"{change:>+7.1%}{status}")
+    return regressions
+
+
+def bench_csv_sink(count_of_offers, dir_path):
+    file_path = os.path.join(dir_path, f'sink_{count_of_offers}.csv')
+    start = time.perf_counter()
+    with CsvSink(file_path, FIELDS_OF_OFFER) as sink:
+        for _ in range(count_of_offers):
+            sink.write(OFFER)
+    return os.path.getsize(file_path), time.perf_counter() - start
+
+
+def bench_csv_rewrite(count_of_offers, dir_path):
+    """Previous behaviour: the whole file is rewritten after every parsed offer."""
+    file_path = os.path.join(dir_path, f'rewrite_{count_of_offers}.csv')
+    total_bytes = 0
+    start = time.perf_counter()
+    for count in range(1, count_of_offers + 1):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        with CsvSink(file_path, FIELDS_OF_OFFER) as sink:
+            for _ in range(count):
+                sink.write(OFFER)
+        total_bytes += os.path.getsize(file_path)
+    return total_bytes, time.perf_counter() - start
+
+
+def bench_csv():
+    with tempfile.TemporaryDirectory() as dir_path:
+        print(f"{'offers':>8} | {'append bytes':>14} | {'rewrite bytes':>14} | {'append s':>9} | {'rewrite s':>9}")
+        for count_of_offers in COUNTS_OF_OFFERS:
+            sink_bytes, sink_time = bench_csv_sink(count_of_offers, dir_path)
+            rewrite_bytes, rewrite_time = bench_csv_rewrite(count_of_offers, dir_path)
+            print(f"{count_of_offers:>8} | {sink_bytes:>14} | {rewrite_bytes:>14} | {sink_time:>9.3f} | {rewrite_time:>9.3f}")
+
+
+def create_offer_dict(ind):
+    return {**OFFER, 'link': f'https://www.cian.ru/rent/flat/{300000000 + ind}/', 'price_per_m2': ind}
+
+
+def create_offer_record(ind):
+    offer = RentLongOffer()
+    offer.update(OFFER)
+    offer.link = f'https://www.cian.ru/rent/flat/{300000000 + ind}/'
+    offer.price_per_m2 = ind
+    return offer
+
+
+def measure_memory_per_offer(create_offer):
+    tracemalloc.start()
+    offers = [create_offer(ind) for ind in range(COUNT_OF_MEMORY_OFFERS)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del offers
+    return size / COUNT_OF_MEMORY_OFFERS
+
+
+def bench_offer_memory():
+    """Memory per parsed offer kept in results: dict as before and slotted Offer record."""
+    print(f"{'record':>14} | {'bytes per offer':>15}")
+    for name, create_offer in (('dict', create_offer_dict), ('Offer', create_offer_record)):
+        print(f"{name:>14} | {measure_memory_per_offer(create_offer):>15.0f}")
+
+
+class NullSink:
+    def __init__(self):
+        self.count_written = 0
+
+    def open(self):
+        pass
+
+    def write(self, record):
+        self.count_written += 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def create_latin_offers():
+    """Offers with values repeating like in real crawl: one city, tens of addresses and hundreds of agencies."""
+    return [
+        {**OFFER, 'author': f'Агентство {ind % 300}', 'address': f'Замоскворечье, улица {ind % 40}'}
+        for ind in range(COUNT_OF_LATIN_OFFERS)
+    ]
+
+
+def transliterate_per_card(offers, transliterate):
+    for offer in offers:
+        record = dict(offer)
+        for field in LATIN_FIELDS:
+            if record.get(field):
+                record[field] = transliterate(record[field])
+
+
+def transliterate_at_sink(offers):
+    with LatinSink(NullSink()) as sink:
+        for offer in offers:
+            sink.write(offer)
+
+
+def bench_transliteration():
+    """CPU per record of is_latin: uncached transliterate per card, cached per card and by batches at sink."""
+    import transliterate
+
+    offers = create_latin_offers()
+    variants = (
+        ('per card', lambda: transliterate_per_card(offers, lambda text: transliterate.translit(text, 'ru', True))),
+        ('cached per card', lambda: transliterate_per_card(offers, transliterate_to_latin)),
+        ('batch at sink', lambda: transliterate_at_sink(offers)),
+    )
+    print(f"{'transliteration':>16} | {'us per record':>13}")
+    for name, run in variants:
+        transliterate_to_latin.cache_clear()
+        start = time.process_time()
+        run()
+        print(f"{name:>16} | {(time.process_time() - start) / len(offers) * 1e6:>13.1f}")
+
+
+def bench_sqlite_sink(dir_path, price_step):
+    file_path = os.path.join(dir_path, 'cian.sqlite')
+    start = time.perf_counter()
+    with SqliteSink(file_path) as sink:
+        for ind in range(COUNT_OF_SQLITE_OFFERS):
+            sink.write(dict(
+                OFFER,
+                link=f'https://www.cian.ru/rent/flat/{300000000 + ind}/',
+                price_per_month=OFFER['price_per_month'] + price_step * (ind % 10 == 0),
+            ))
+    return COUNT_OF_SQLITE_OFFERS / (time.perf_counter() - start)
+
+
+def bench_sqlite():
+    """First run inserts offers, second one updates them and every tenth offer gets a new price."""
+    with tempfile.TemporaryDirectory() as dir_path:
+        print(f"{'sqlite offers':>14} | {'insert/s':>9} | {'upsert/s':>9}")
+        insert_speed = bench_sqlite_sink(dir_path, price_step=0)
+        upsert_speed = bench_sqlite_sink(dir_path, price_step=1000)
+        print(f"{COUNT_OF_SQLITE_OFFERS:>14} | {insert_speed:>9.0f} | {upsert_speed:>9.0f}")
+
+
+if __name__ == '__main__':
+    arguments_parser = argparse.ArgumentParser(description='Offline benchmarks of cianparser over saved html fixtures')
+    arguments_parser.add_argument('--save', help='save results of extractors to json file, to compare next versions')
+    arguments_parser.add_argument('--compare', help='compare results of extractors with json file saved by --save')
+    arguments_parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                                  help='slowdown against --compare file, which is reported as regression')
+    arguments_parser.add_argument('--skip-csv', action='store_true', help='do not run benchmarks of csv and sqlite sinks')
+    arguments = arguments_parser.parse_args()
+
+    check_import_time()
+    check_parser_backends()
+    check_json_state()
+    check_count_of_offers()
+    check_plan_shards()
+    results = bench_extractors()
+    if arguments.save:
+        with open(arguments.save, 'w') as file:
+            json.dump(results, file, indent=2)
+    if not arguments.skip_csv:
+        bench_csv()
+        bench_sqlite()
+    bench_offer_memory()
+    bench_transliteration()
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            if compare_with_baseline(results, json.load(file), arguments.tolerance):
+                sys.exit(1)
@@ -1,4 +1,13 @@
-from .cianparser import list_cities, parse_auto, parse_by_url
+from .cianparser import (
+    list_cities, parse_auto, parse_by_url, iter_auto, iter_by_url, parse_auto_async, parse_by_url_async, parse_many,
+    find_city, parse_sharded, iter_sharded,
+)
+from .offer import Offer
+from .rate_limiter import RateLimiter, SharedRateLimiter
+from .response_cache import ResponseCache
+from .seen_index import SeenIndex
+from .session_pool import SessionPool
+from .stats import CrawlStats
 
 __author__ = "lenarsaitov"
 __mail__ = "lenarsaitov1@yandex.ru"
@@ -0,0 +1,163 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from cianparser.constants import HEADERS
+from cianparser.helpers import define_id_url
+
+
+class AsyncParserOffers:
+    """Runs a ParserOffers crawl on asyncio: listing and offer pages are coroutines under one semaphore.
+
+    Html is parsed with the same extractors as in the synchronous parser, records and statistics
+    are accumulated in the wrapped parser in the order of cards. Only network requests are awaited on the loop:
+    parsing, the response cache, the checkpoint and the sink run in threads. Everything that changes the state
+    of the parser runs in one thread in turn, offer pages and the response cache in the default executor.
+    """
+
+    def __init__(self, parser, max_workers: int = 10, semaphore: asyncio.Semaphore = None):
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            raise ImportError('Asynchronous parsing requires aiohttp. Install it: pip install aiohttp')
+
+        self.parser = parser
+        self.semaphore = semaphore or asyncio.Semaphore(max_workers)
+        self.session = None
+        self.executor = None
+        self._prefetched_page = None
+
+    async def run(self) -> list:
+        import aiohttp
+
+        print(f"\n{' ' * 30}Preparing to collect information from pages..")
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            try:
+                await self._run_in_executor(self.parser._load_checkpoint)
+                await self._run_in_executor(self.parser._open_sink)
+                async with aiohttp.ClientSession(headers=HEADERS) as self.session:
+                    await self._run_pages()
+            finally:
+                self._cancel_prefetch()
+                self.session = None
+                await self._run_in_executor(self.parser._close_sink)
+                await self._run_in_executor(self.parser.stats.dump)
+            await self._run_in_executor(self.parser._remove_checkpoint)
+        finally:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+        self.parser._print_summary()
+        return self.parser.get_results()
+
+    async def _run_pages(self) -> None:
+        parser = self.parser
+        number_page = parser._define_next_page(parser.start_page - 1)
+        while number_page is not None:
+            for attempt_number in range(1, 4):
+                try:
+                    await self._load_and_parse_page(number_page, parser.last_page + 1 - parser.start_page)
+                    await self._run_in_executor(parser._save_checkpoint, number_page)
+                    break
+                except Exception as exc:
+                    parser.stats.increment("retries")
+                    print(f"\n\nException: {exc}")
+                    parser.rate_limiter.report_throttling()
+                    if parser.response_cache is not None and parser.url is not None:
+                        await self._run_in_thread(parser.response_cache.delete, parser.url)
+                    print(f'Retrying. Attempt number {attempt_number}')
+            else:
+                raise Exception('Couldn\'t parse cian.ru')
+            number_page = parser._define_next_page(number_page)
+
+    async def _load_and_parse_page(self, number_page: int, count_of_pages: int) -> None:
+        parser = self.parser
+        parser.url = parser._build_url(number_page)
+        html = await self._load_page(number_page)
+        offers = await self._run_in_executor(parser._select_offers, html, number_page)
+        if offers is None:
+            return
+
+        next_page = parser._define_next_page(number_page)
+        if next_page is not None:
+            self._prefetched_page = (next_page, asyncio.ensure_future(self._get(parser._build_url(next_page))))
+
+        pages_data = [None] * len(offers)
+        if not parser.is_express_mode:
+            pages_data = [
+                asyncio.ensure_future(self._load_page_offer(link)) if link is not None else None
+                for link in parser._define_links_to_load(offers)
+            ]
+
+        try:
+            for ind, block in enumerate(offers):
+                record = None
+                if pages_data[ind] is None:
+                    record = await self._run_in_executor(parser._parse_block, block)
+                else:
+                    record = await self._run_in_executor(parser._parse_block, block, await pages_data[ind])
+                if record is not None:
+                    parser.result.append(record)
+                parser._print_progress(number_page, count_of_pages, ind, offers)
+        finally:
+            for page_data in pages_data:
+                if page_data is not None:
+                    page_data.cancel()
+
+    async def _load_page(self, number_page: int) -> str:
+        """Html of page with list, the next page is prefetched while cards of the current one are parsed."""
+        if self._prefetched_page is not None and self._prefetched_page[0] == number_page:
+            prefetched_html = self._prefetched_page[1]
+            self._prefetched_page = None
+            return await prefetched_html
+
+        self._cancel_prefetch()
+        return await self._get(self.parser.url)
+
+    def _cancel_prefetch(self) -> None:
+        if self._prefetched_page is not None:
+            self._prefetched_page[1].cancel()
+            self._prefetched_page = None
+
+    async def _load_page_offer(self, link: str) -> dict:
+        for attempt_number in range(1, 4):
+            try:
+                html = await self._get(link, is_page_offer=True)
+                return await self._run_in_thread(self.parser._define_page_data, html, define_id_url(link))
+            except Exception as exc:
+                if attempt_number == 3:
+                    raise
+                self.parser._report_offer_retry(exc, attempt_number)
+
+    async def _run_in_executor(self, function, *args):
+        """Result of function, which changes the state of parser, called in its thread in turn with the others."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    @staticmethod
+    async def _run_in_thread(function, *args):
+        """Result of function called in the default executor of the loop."""
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    async def _get(self, url: str, is_page_offer: bool = False) -> str:
+        response_cache = self.parser.response_cache
+        stats = self.parser.stats
+        if response_cache is not None:
+            html = await self._run_in_thread(response_cache.get, url, is_page_offer)
+            if html is not None:
+                stats.increment("cache_hits")
+                return html
+
+        async with self.semaphore:
+            with stats.measure("rate_limit_wait"):
+                await self.parser.rate_limiter.acquire_async()
+            with stats.measure("offer_fetch" if is_page_offer else "listing_fetch"):
+                async with self.session.get(url) as res:
+                    body = await res.read()
+            stats.increment("requests")
+            stats.increment("bytes", len(body))
+            res.raise_for_status()
+            html = body.decode(res.get_encoding())
+        self.parser.rate_limiter.report_success()
+        if response_cache is not None:
+            await self._run_in_thread(response_cache.put, url, html, is_page_offer)
+        return html
@@ -0,0 +1,129 @@
+import functools
+import re
+
+PARSER_BACKENDS = ("bs4", "lxml", "selectolax")
+
+SIMPLE_SELECTOR_REG_EXPRESSION = re.compile(r"^([a-z0-9]+)(?:\[([\w-]+)='([^']*)'\])?$")
+
+
+def make_document(html: str, parser_backend: str = "bs4"):
+    """Parse html into a tree whose nodes support the subset of BeautifulSoup api used by extractors:
+    select, select_one, text, get, contents and `string in node`.
+    """
+    if parser_backend == "bs4":
+        from bs4 import BeautifulSoup
+
+        try:
+            return BeautifulSoup(html, 'lxml')
+        except:
+            return BeautifulSoup(html, 'html.parser')
+    if parser_backend == "lxml":
+        return LxmlNode.from_html(html)
+    if parser_backend == "selectolax":
+        return SelectolaxNode.from_html(html)
+
+    raise ValueError(f'You entered parser_backend={parser_backend}, which is not valid value. '
+                     f'Try entering one of these values: "bs4", "lxml", "selectolax".')
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_xpath(selector: str):
+    from lxml import etree
+
+    match = SIMPLE_SELECTOR_REG_EXPRESSION.match(selector)
+    if match is None:
+        raise ValueError(f'Selector {selector} is not supported by lxml parser backend')
+
+    tag, attribute, value = match.groups()
+    path = f"descendant::{tag}"
+    if attribute is not None:
+        path += f"[@{attribute}='{value}']"
+    return etree.XPath(path)
+
+
+class LxmlNode:
+    __slots__ = ("element",)
+
+    def __init__(self, element):
+        self.element = element
+
+    @classmethod
+    def from_html(cls, html: str):
+        import lxml.html
+
+        root = lxml.html.document_fromstring(html)
+        for element in root.xpath("//script|//style|//template"):
+            element.drop_tree()
+        return cls(root)
+
+    def select(self, selector: str) -> list:
+        return [LxmlNode(element) for element in _compile_xpath(selector)(self.element)]
+
+    def select_one(self, selector: str):
+        elements = _compile_xpath(selector)(self.element)
+        return LxmlNode(elements[0]) if elements else None
+
+    @property
+    def text(self) -> str:
+        return self.element.text_content()
+
+    def get(self, name: str, default=None):
+        return self.element.get(name, default)
+
+    @property
+    def contents(self) -> list:
+        contents = []
+        if self.element.text:
+            contents.append(self.element.text)
+        for child in self.element:
+            contents.append(LxmlNode(child))
+            if child.tail:
+                contents.append(child.tail)
+        return contents
+
+    def __contains__(self, item) -> bool:
+        return item in self.contents
+
+
+class SelectolaxNode:
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+    @classmethod
+    def from_html(cls, html: str):
+        try:
+            from selectolax.lexbor import LexborHTMLParser
+        except ImportError:
+            raise ImportError('Parser backend "selectolax" requires selectolax. Install it: pip install selectolax')
+
+        tree = LexborHTMLParser(html)
+        tree.strip_tags(["script", "style", "template"])
+        return cls(tree.root)
+
+    def select(self, selector: str) -> list:
+        return [SelectolaxNode(node) for node in self.node.css(selector) if node != self.node]
+
+    def select_one(self, selector: str):
+        for node in self.node.css(selector):
+            if node != self.node:
+                return SelectolaxNode(node)
+        return None
+
+    @property
+    def text(self) -> str:
+        return self.node.text(deep=True)
+
+    def get(self, name: str, default=None):
+        return self.node.attributes.get(name, default)
+
+    @property
+    def contents(self) -> list:
+        return [
+            child.text(deep=False) if child.tag == "-text" else SelectolaxNode(child)
+            for child in self.node.iter(include_text=True)
+        ]
+
+    def __contains__(self, item) -> bool:
+        return item in self.contents
@@ -0,0 +1,83 @@
+import queue
+
+from cianparser.constants import FIELDS_OF_OFFER
+from cianparser.rate_limiter import SharedRateLimiter
+from cianparser.sinks import CsvSink
+
+_worker_rate_limiter = None
+_worker_records = None
+
+
+def parse_many(queries, workers=None, rate_limiter=None, file_path=None, csv_flush_every=1):
+    """Parse several queries in a pool of processes with one requests budget for all of them.
+
+    Examples:
+        >>> queries = [{"deal_type": "sale", "accommodation_type": "flat", "location": city[0]} for city in CITIES]
+        >>> results = cianparser.parse_many(queries, workers=4, file_path="all_cities.csv")
+    :param queries: list of dicts with arguments of parse_auto, e.g. {"deal_type": "sale", "location": "Казань", ...}.
+        A query may contain is_saving_csv=True to save its announcements to its own csv file,
+        but not rate_limiter, ValueError is raised then
+    :param workers: count of processes, default count of cpu
+    :param rate_limiter: cianparser.SharedRateLimiter for requests of all processes, default SharedRateLimiter()
+    :param file_path: path of csv file, where announcements of all queries are saved, default None
+    :param csv_flush_every: how many announcements are appended to file_path before flushing it to disk, default 1
+    :return: list with list of announcements for every query, in the order of queries
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    for index, query in enumerate(queries):
+        if "rate_limiter" in query:
+            raise ValueError(f'You entered rate_limiter in query {index}, which is not valid for parse_many: '
+                             f'all queries share one requests budget. Pass it as parse_many(queries, rate_limiter=...)')
+
+    if rate_limiter is None:
+        rate_limiter = SharedRateLimiter()
+
+    records = multiprocessing.get_context().Queue()
+    results = [[] for _ in queries]
+    sink = CsvSink(file_path, FIELDS_OF_OFFER, flush_every=csv_flush_every) if file_path else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(rate_limiter, records)) as executor:
+            futures = [executor.submit(_parse_query, index, query) for index, query in enumerate(queries)]
+            count_of_running = len(futures)
+            while count_of_running > 0:
+                try:
+                    index, record = records.get(timeout=1)
+                except queue.Empty:
+                    if all(future.done() for future in futures) and records.empty():
+                        break
+                    continue
+
+                if record is None:
+                    count_of_running -= 1
+                    continue
+
+                results[index].append(record)
+                if sink is not None:
+                    sink.write(record)
+
+            for future in futures:
+                future.result()
+    finally:
+        if sink is not None:
+            sink.close()
+
+    return results
+
+
+def _init_worker(rate_limiter, records) -> None:
+    global _worker_rate_limiter, _worker_records
+    _worker_rate_limiter = rate_limiter
+    _worker_records = records
+
+
+def _parse_query(index: int, query: dict) -> None:
+    from cianparser.cianparser import iter_auto
+
+    try:
+        for record in iter_auto(**query, rate_limiter=_worker_rate_limiter):
+            _worker_records.put((index, record))
+    finally:
+        _worker_records.put((index, None))
@@ -0,0 +1,79 @@
+import json
+import os
+
+
+class Checkpoint:
+    """Progress of a crawl in a json file, which is rewritten after every completed page with list of announcements.
+
+    It keeps the url of the first page, the output file, completed pages, running aggregates and the positions
+    of the output file and of the file with ids of parsed offers at the end of the last completed page.
+    Ids are appended to a separate file `<path>.ids`, one per line, so saving does not rewrite them all.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ids_path = f"{path}.ids"
+        self.url = None
+        self.file_path = None
+        self.completed_pages = set()
+        self.seen_offer_ids = set()
+        self.ids_position = 0
+        self.parsed_announcements_count = 0
+        self.average_price = 0
+        self.sink_position = 0
+        self.count_written = 0
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> None:
+        with open(self.path, encoding="utf-8") as file:
+            state = json.load(file)
+
+        self.url = state["url"]
+        self.file_path = state["file_path"]
+        self.completed_pages = set(state["completed_pages"])
+        self.ids_position = state["ids_position"]
+        self.seen_offer_ids = self._load_offer_ids()
+        self.parsed_announcements_count = state["parsed_announcements_count"]
+        self.average_price = state["average_price"]
+        self.sink_position = state["sink_position"]
+        self.count_written = state["count_written"]
+
+    def add_offer_ids(self, offer_ids) -> None:
+        """Append ids of offers parsed since the last save, they are taken into account by the next save."""
+        with open(self.ids_path, "a", encoding="utf-8") as file:
+            file.writelines(f"{offer_id}\n" for offer_id in offer_ids)
+            self.ids_position = file.tell()
+
+    def save(self) -> None:
+        state = {
+            "url": self.url,
+            "file_path": self.file_path,
+            "completed_pages": sorted(self.completed_pages),
+            "ids_position": self.ids_position,
+            "parsed_announcements_count": self.parsed_announcements_count,
+            "average_price": self.average_price,
+            "sink_position": self.sink_position,
+            "count_written": self.count_written,
+        }
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+        os.replace(temporary_path, self.path)
+
+    def remove(self) -> None:
+        if self.exists():
+            os.remove(self.path)
+        if os.path.exists(self.ids_path):
+            os.remove(self.ids_path)
+
+    def _load_offer_ids(self) -> set:
+        """Ids written before the last save, ids appended by an interrupted page after it are dropped."""
+        if not os.path.exists(self.ids_path):
+            return set()
+
+        with open(self.ids_path, "r+", encoding="utf-8") as file:
+            offer_ids = set(file.read(self.ids_position).split())
+            file.truncate(self.ids_position)
+        return offer_ids
@@ -1,7 +1,12 @@
 import pathlib
 
+from cianparser.batch import parse_many
+from cianparser.cities import find_city
 from cianparser.constants import *
 from cianparser.parser import ParserOffersAuto, ParserOffersByURL
+from cianparser.rate_limiter import RateLimiter
+from cianparser.sharding import iter_shards, plan_shards
+from cianparser.stats import CrawlStats
 
 
 offer_types = {"rent_long", "rent_short", "sale"}
@@ -16,7 +21,10 @@ def list_cities():
 
 def parse_auto(deal_type, accommodation_type, location, rooms="all", start_page=1, end_page=100,
                is_saving_csv=False, is_latin=False, is_express_mode=False, is_by_homeowner=False,
-               data_dir_path=None):
+               data_dir_path=None, csv_flush_every=1,
+               max_workers=1, rate_limiter=None, seen_index=None,
+               response_cache=None, parser_backend="bs4", stats=None, output_format="csv", resume=None,
+               session_pool=None):
     """Parse information from cian website.
 
     Examples:
@@ -30,10 +38,154 @@ def parse_auto(deal_type, accommodation_type, location, rooms="all", start_page=
     :param start_page: the page from which the parser starts, default 1
     :param end_page: the page from which the parser ends, default 100
     :param is_saving_csv: is it necessary to save data in csv
-    :param is_latin: is it necessary to save data in latin
+    :param is_latin: is it necessary to save data in latin, "sink" - to transliterate only saved file by batches (requires is_saving_csv)
     :param is_express_mode:  is it necessary to speed up data collection (but without some fields)
     :param is_by_homeowner:  is it necessary to parse only announcements created by homeowner
+    :param csv_flush_every: how many parsed announcements are appended to csv before flushing it to disk, default 1
+    :param max_workers: how many offer pages are loaded concurrently (not in express mode), default 1
+    :param rate_limiter: cianparser.RateLimiter pacing requests to cian, may be shared by several parsers, default RateLimiter()
+    :param seen_index: cianparser.SeenIndex with ids of offers parsed in previous runs, their pages are not loaded again
+    :param response_cache: cianparser.ResponseCache with recently loaded pages, they are not requested again
+    :param parser_backend: html parser, "bs4" (default), "lxml" or "selectolax" (faster, requires selectolax)
+    :param stats: cianparser.CrawlStats collecting counters and latencies of stages, it is dumped to stats.path at the end
+    :param output_format: format of file saved by is_saving_csv, "csv" (default), "parquet" (typed, requires pyarrow)
+        or "sqlite" (one database cian.sqlite in data_dir_path, updated by every run)
+    :param resume: path of checkpoint file saved after every page; if it exists, the interrupted crawl continues
+        from it into the same file (csv or sqlite), the checkpoint is removed when the crawl is completed
+    :param session_pool: cianparser.SessionPool, requests are distributed over its sessions, each of them with its own
+        proxy and rate limit, then rate_limiter is not applied by default
     """
+    parser = _create_parser_auto(
+        deal_type, accommodation_type, location, rooms, start_page, end_page,
+        is_saving_csv, is_latin, is_express_mode, is_by_homeowner,
+        data_dir_path, csv_flush_every,
+        max_workers, rate_limiter, seen_index, response_cache, parser_backend, stats, output_format,
+        resume, session_pool,
+    )
+    if parser is None:
+        return []
+
+    parser.run()
+    return parser.get_results()
+
+
+def iter_auto(deal_type, accommodation_type, location, rooms="all", start_page=1, end_page=100,
+              is_saving_csv=False, is_latin=False, is_express_mode=False, is_by_homeowner=False,
+              data_dir_path=None, csv_flush_every=1,
+              max_workers=1, rate_limiter=None, seen_index=None,
+              response_cache=None, parser_backend="bs4", stats=None, output_format="csv", resume=None,
+              session_pool=None):
+    """Same as parse_auto, but yields announcements one by one as soon as they are parsed.
+
+    Parsed announcements are not accumulated in memory, so it suits long crawls.
+
+    Examples:
+        >>> for offer in cianparser.iter_auto(deal_type="sale", accommodation_type="flat", location="Казань"):
+        ...     print(offer["link"])
+    """
+    parser = _create_parser_auto(
+        deal_type, accommodation_type, location, rooms, start_page, end_page,
+        is_saving_csv, is_latin, is_express_mode, is_by_homeowner,
+        data_dir_path, csv_flush_every,
+        max_workers, rate_limiter, seen_index, response_cache, parser_backend, stats, output_format,
+        resume, session_pool,
+    )
+    if parser is None:
+        return iter([])
+
+    return _iter_records(parser.iter_results())
+
+
+async def parse_auto_async(deal_type, accommodation_type, location, rooms="all", start_page=1, end_page=100,
+                           is_saving_csv=False, is_latin=False, is_express_mode=False, is_by_homeowner=False,
+                           data_dir_path=None, csv_flush_every=1,
+                           max_workers=10, rate_limiter=None, seen_index=None,
+                           response_cache=None, parser_backend="bs4", stats=None, output_format="csv", resume=None):
+    """Parse information from cian website in asyncio event loop, arguments are the same as in parse_auto.
+
+    Examples:
+        >>> data = await cianparser.parse_auto_async(deal_type="sale", accommodation_type="flat", location="Казань")
+    :param max_workers: how many requests may be in flight at the same time, default 10
+    """
+    parser = _create_parser_auto(
+        deal_type, accommodation_type, location, rooms, start_page, end_page,
+        is_saving_csv, is_latin, is_express_mode, is_by_homeowner,
+        data_dir_path, csv_flush_every,
+        max_workers, rate_limiter, seen_index, response_cache, parser_backend, stats, output_format,
+        resume, None,
+    )
+    if parser is None:
+        return []
+
+    from cianparser.async_parser import AsyncParserOffers
+
+    return await AsyncParserOffers(parser, max_workers=max_workers).run()
+
+
+def parse_sharded(deal_type, accommodation_type, location, rooms="all", workers=4,
+                  is_saving_csv=False, is_latin=False, is_express_mode=False, is_by_homeowner=False,
+                  data_dir_path=None, csv_flush_every=1,
+                  max_workers=1, rate_limiter=None, seen_index=None,
+                  response_cache=None, parser_backend="bs4", stats=None, output_format="csv",
+                  session_pool=None):
+    """Parse all announcements of a query, which has more of them than cian shows on its 54 pages.
+
+    The query is split into bands of price (and of total area, if needed) by the count of announcements
+    on the first page of every band, the bands are parsed in parallel, arguments are the same as in parse_auto.
+
+    Examples:
+        >>> data = cianparser.parse_sharded(deal_type="sale", accommodation_type="flat", location="Москва", workers=4)
+    :param workers: how many bands are parsed at the same time, default 4
+    """
+    return list(iter_sharded(
+        deal_type, accommodation_type, location, rooms, workers,
+        is_saving_csv, is_latin, is_express_mode, is_by_homeowner,
+        data_dir_path, csv_flush_every,
+        max_workers, rate_limiter, seen_index, response_cache, parser_backend, stats, output_format, session_pool,
+    ))
+
+
+def iter_sharded(deal_type, accommodation_type, location, rooms="all", workers=4,
+                 is_saving_csv=False, is_latin=False, is_express_mode=False, is_by_homeowner=False,
+                 data_dir_path=None, csv_flush_every=1,
+                 max_workers=1, rate_limiter=None, seen_index=None,
+                 response_cache=None, parser_backend="bs4", stats=None, output_format="csv",
+                 session_pool=None):
+    """Same as parse_sharded, but yields announcements one by one as soon as they are parsed."""
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(requests_per_second=0) if session_pool is not None else RateLimiter()
+    stats = stats if stats is not None else CrawlStats()
+
+    def create_parser(is_saving):
+        return _create_parser_auto(
+            deal_type, accommodation_type, location, rooms, 1, MAX_COUNT_OF_PAGES,
+            is_saving, is_latin, is_express_mode, is_by_homeowner,
+            data_dir_path, csv_flush_every,
+            max_workers, rate_limiter, seen_index, response_cache, parser_backend, stats, output_format,
+            None, session_pool,
+        )
+
+    parser = create_parser(is_saving_csv)
+    if parser is None:
+        return
+
+    yield from _iter_records(iter_shards(parser, lambda: create_parser(False), plan_shards(parser), workers))
+
+
+def _iter_records(offers):
+    """Offers yielded by parser as plain dicts, see Offer.to_dict; closing it stops the parser."""
+    try:
+        for offer in offers:
+            yield offer.to_dict()
+    finally:
+        offers.close()
+
+
+def _create_parser_auto(deal_type, accommodation_type, location, rooms, start_page, end_page,
+                        is_saving_csv, is_latin, is_express_mode, is_by_homeowner,
+                        data_dir_path, csv_flush_every,
+                        max_workers, rate_limiter, seen_index, response_cache, parser_backend, stats, output_format,
+                        resume, session_pool):
 
     if deal_type not in offer_types:
         raise ValueError(f'You entered deal_type={deal_type}, which is not valid value. '
@@ -68,26 +220,16 @@ def parse_auto(deal_type, accommodation_type, location, rooms="all", start_page=
         raise TypeError(f'In argument "rooms" not valid type of element. '
                         f'It is correct int, str and tuple types. Example 1, (1,3, "studio"), "studio, "all".')
 
-    location_id = None
-
-    finded = False
-    for city in CITIES:
-        if city[0] == location:
-            finded = True
-            location_id = city[1]
-
-    if not finded or location_id is None:
-        raise ValueError(f'You entered {location}, which is not exists in base.'
-                         f' See all correct values of location in cianparser.list_cities()')
+    city_name, location_id = find_city(location)
 
     if deal_type in deal_types_not_implemented_yet or accommodation_type in accommodation_types_not_implemented_yet:
         print("Sorry. This functionality has not yet been implemented, but it is planned...")
-        return []
+        return None
     else:
-        parser = ParserOffersAuto(
+        return ParserOffersAuto(
             deal_type,
             accommodation_type,
-            location,  # city_name
+            city_name,
             location_id,
             rooms,
             start_page,
@@ -97,17 +239,81 @@ def parse_auto(deal_type, accommodation_type, location, rooms="all", start_page=
             is_express_mode,
             is_by_homeowner,
             data_dir_path,
+            csv_flush_every,
+            max_workers,
+            rate_limiter,
+            seen_index,
+            response_cache,
+            parser_backend,
+            stats,
+            output_format,
+            resume,
+            session_pool,
         )
-        parser.run()
-        return parser.get_results()
 
 
 def parse_by_url(search_url: str, deal_type: str, accommodation_type: str, location: str,
                  start_page: int = 1, end_page: int = 100, is_saving_csv=False, is_latin=False,
                  is_express_mode=False, is_by_homeowner=False,
-                 data_dir_path=None):
+                 data_dir_path=None, csv_flush_every=1,
+                 max_workers=1, rate_limiter=None, seen_index=None,
+                 response_cache=None, parser_backend="bs4", stats=None, output_format="csv", resume=None,
+                 session_pool=None):
+
+    parser = _create_parser_by_url(
+        search_url, deal_type, accommodation_type, location, start_page, end_page,
+        is_saving_csv, is_latin, is_express_mode, is_by_homeowner,
+        data_dir_path, csv_flush_every,
+        max_workers, rate_limiter, seen_index, response_cache, parser_backend, stats, output_format,
+        resume, session_pool,
+    )
+    parser.run()
+    return parser.get_results()
+
+
+def iter_by_url(search_url: str, deal_type: str, accommodation_type: str, location: str,
+                start_page: int = 1, end_page: int = 100, is_saving_csv=False, is_latin=False,
+                is_express_mode=False, is_by_homeowner=False,
+                data_dir_path=None, csv_flush_every=1,
+                max_workers=1, rate_limiter=None, seen_index=None,
+                response_cache=None, parser_backend="bs4", stats=None, output_format="csv", resume=None,
+                session_pool=None):
+    """Same as parse_by_url, but yields announcements one by one as soon as they are parsed."""
+    parser = _create_parser_by_url(
+        search_url, deal_type, accommodation_type, location, start_page, end_page,
+        is_saving_csv, is_latin, is_express_mode, is_by_homeowner,
+        data_dir_path, csv_flush_every,
+        max_workers, rate_limiter, seen_index, response_cache, parser_backend, stats, output_format,
+        resume, session_pool,
+    )
+    return _iter_records(parser.iter_results())
+
 
-    parser = ParserOffersByURL(
+async def parse_by_url_async(search_url: str, deal_type: str, accommodation_type: str, location: str,
+                             start_page: int = 1, end_page: int = 100, is_saving_csv=False, is_latin=False,
+                             is_express_mode=False, is_by_homeowner=False,
+                             data_dir_path=None, csv_flush_every=1,
+                             max_workers=10, rate_limiter=None, seen_index=None,
+                             response_cache=None, parser_backend="bs4", stats=None, output_format="csv", resume=None):
+
+    parser = _create_parser_by_url(
+        search_url, deal_type, accommodation_type, location, start_page, end_page,
+        is_saving_csv, is_latin, is_express_mode, is_by_homeowner,
+        data_dir_path, csv_flush_every,
+        max_workers, rate_limiter, seen_index, response_cache, parser_backend, stats, output_format,
+        resume, None,
+    )
+    from cianparser.async_parser import AsyncParserOffers
+
+    return await AsyncParserOffers(parser, max_workers=max_workers).run()
+
+
+def _create_parser_by_url(search_url, deal_type, accommodation_type, location, start_page, end_page,
+                          is_saving_csv, is_latin, is_express_mode, is_by_homeowner,
+                          data_dir_path, csv_flush_every,
+                          max_workers, rate_limiter, seen_index, response_cache, parser_backend, stats, output_format,
+                          resume, session_pool):
+    return ParserOffersByURL(
         search_url,
         deal_type,
         accommodation_type,
@@ -119,6 +325,14 @@ def parse_by_url(search_url: str, deal_type: str, accommodation_type: str, locat
         is_express_mode,
         is_by_homeowner,
         data_dir_path,
+        csv_flush_every,
+        max_workers,
+        rate_limiter,
+        seen_index,
+        response_cache,
+        parser_backend,
+        stats,
+        output_format,
+        resume,
+        session_pool,
     )
-    parser.run()
-    return parser.get_results()
@@ -0,0 +1,87 @@
+import difflib
+import re
+
+from cianparser.constants import CITIES, CITY_ALIASES
+
+LATIN_LETTERS = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh", "з": "z", "и": "i", "й": "y",
+    "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "", "э": "e",
+    "ю": "yu", "я": "ya",
+}
+# other common romanizations: of the transliterate package (used by is_latin) and of russian passports
+LATIN_LETTERS_VARIANTS = (
+    {"й": "j", "х": "h", "ц": "c", "щ": "sch", "ю": "ju", "я": "ja"},
+    {"й": "i", "ц": "ts", "ю": "iu", "я": "ia"},
+)
+# english romanization of maps and news (Yekaterinburg, Oryol, Grozny), applied to the name before LATIN_LETTERS
+ENGLISH_ROMANIZATION_RULES = (
+    (re.compile(r"(?<![а-яё])е|(?<=[аеёиоуыэюяъь])е"), "ye"),
+    (re.compile(r"(?<=[жчшщ])ё"), "o"),
+    (re.compile(r"ё"), "yo"),
+    (re.compile(r"[иы]й(?![а-яё])"), "y"),
+)
+COUNT_OF_SUGGESTIONS = 3
+SUGGESTION_CUTOFF = 0.7
+
+_index = None
+
+
+def normalize_city_name(name: str) -> str:
+    """Case-folded name without hyphens, spaces and punctuation, ё is replaced by е."""
+    return "".join(char for char in name.casefold().replace("ё", "е") if char.isalnum())
+
+
+def find_city(location: str) -> tuple:
+    """Name and region id of city by its name in any case, with ё or е, with or without hyphens, or in latin.
+
+    Raises ValueError with the closest names, if city is not found.
+    """
+    index = _get_index()
+    key = normalize_city_name(location)
+    if key in index:
+        return index[key]
+
+    suggestions = []
+    for close_key in difflib.get_close_matches(key, index.keys(), n=COUNT_OF_SUGGESTIONS * 4, cutoff=SUGGESTION_CUTOFF):
+        city_name = index[close_key][0]
+        if city_name not in suggestions:
+            suggestions.append(city_name)
+    did_you_mean = f' Did you mean: {", ".join(suggestions[:COUNT_OF_SUGGESTIONS])}?' if suggestions else ''
+    raise ValueError(f'You entered {location}, which is not exists in base.{did_you_mean}'
+                     f' See all correct values of location in cianparser.list_cities()')
+
+
+def _get_index() -> dict:
+    global _index
+    if _index is None:
+        _index = _build_index()
+    return _index
+
+
+def _build_index() -> dict:
+    index = dict()
+    for city_name, location_id in CITIES:
+        key = normalize_city_name(city_name)
+        index[key] = (city_name, location_id)
+        for latin_key in _define_latin_keys(city_name):
+            index.setdefault(latin_key, (city_name, location_id))
+
+    cities = {city_name: (city_name, location_id) for city_name, location_id in CITIES}
+    for alias, city_name in CITY_ALIASES.items():
+        index.setdefault(normalize_city_name(alias), cities[city_name])
+    return index
+
+
+def _define_latin_keys(city_name: str) -> set:
+    key = normalize_city_name(city_name)
+    latin_keys = set()
+    for variant in ({}, *LATIN_LETTERS_VARIANTS):
+        letters = {**LATIN_LETTERS, **variant}
+        latin_keys.add("".join(letters.get(char, char) for char in key))
+
+    english_name = city_name.casefold()
+    for pattern, replacement in ENGLISH_ROMANIZATION_RULES:
+        english_name = pattern.sub(replacement, english_name)
+    latin_keys.add("".join(LATIN_LETTERS.get(char, char) for char in normalize_city_name(english_name)))
+    return latin_keys
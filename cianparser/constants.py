@@ -4,14 +4,33 @@ DURATION_TYPE_PARAMETER = "&type={}"
 DEAL_TYPE = "&deal_type={}"
 
 FLOATS_NUMBERS_REG_EXPRESSION = r"[+-]? *(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?"
+INTEGERS_REG_EXPRESSION = r"\d+"
 
 ROOM = "&room{}=1"
 STUDIO = "&room9=1"
 WITHOUT_NEIGHBORS_OF_CITY = "&with_neighbors=0"
 IS_ONLY_HOMEOWNER = "&is_by_homeowner=1"
+MIN_PRICE = "&minprice={}"
+MAX_PRICE = "&maxprice={}"
+MIN_TOTAL_AREA = "&mintarea={}"
+MAX_TOTAL_AREA = "&maxtarea={}"
+
+HEADERS = {'Accept-Language': 'en'}
+WARM_UP_URL = "https://www.cian.ru/"
 
 CITIES = [['Абакан', '4628'], ['Анадырь', '4634'], ['Анапа', '5129'], ['Архангельск', '4557'], ['Астрахань', '4558'], ['Барнаул', '4555'], ['Белгород', '4561'], ['Биробиджан', '4569'], ['Благовещенск', '4556'], ['Бронницы', '4690'], ['Брянск', '4562'], ['Видный', '5922'], ['Владивосток', '4604'], ['Владикавказ', '4613'], ['Владимир', '4564'], ['Волгоград', '4565'], ['Вологда', '4566'], ['Волоколамск', '5379'], ['Воронеж', '4567'], ['Воскресенск', '5388'], ['Геленджик', '4717'], ['Горно-Алтайск', '4554'], ['Грозный', '4631'], ['Дзержинский', '4734'], ['Дмитров', '5482'], ['Долгопрудный', '4738'], ['Дубна', '4741'], ['Екатеринбург', '4612'], ['Жуковский', '4750'], ['Звенигород', '4756'], ['Иванов', '4570'], ['Ижевск', '4624'], ['Иркутск', '4572'], ['Йошкар-Ола', '4591'], ['Казань', '4618'], ['Калининград', '4574'], ['Калуга', '4576'], ['Кемерово', '4580'], ['Киров', '4581'], ['Коломна', '4809'], ['Королёв', '4813'], ['Кострома', '4583'], ['Красноармейск', '4817'], ['Краснодар', '4584'], ['Краснознаменск', '4822'], ['Красноярск', '4585'], ['Курган', '4586'], ['Курск', '4587'], ['Кызыл', '4622'], ['Липецк', '4589'], ['Лобня', '4848'], ['Лыткарино', '4851'], ['Магадан', '4590'], ['Майкоп', '4553'], ['Махачкала', '4568'], ['Москва', '1'], ['Мурманск', '4594'], ['Назрань', '4571'], ['Нальчик', '4573'], ['Нарьян-Мар', '4595'], ['Новгород', '4596'], ['Новороссийск', '4896'], ['Новосибирск', '4598'], ['Омск', '4599'], ['Оренбург', '4600'], ['Орехово-Зуево', '4916'], ['Орёл', '4601'], ['Пенза', '4602'], ['Пермь', '4603'], ['Петрозаводск', '4579'], ['Петропавловск-Камчатский', '4577'], ['Подольск', '4935'], ['Протвино', '4945'], ['Псков', '4605'], ['Пущино', '4949'], ['Реутов', '4958'], ['Ростов-На-Дону', '4606'], ['Рошаль', '4960'], ['Рязань', '4607'], ['Салехард', '4635'], ['Самара', '4608'], ['Санкт-Петербург', '2'], ['Саранск', '4592'], ['Саратов', '4609'], ['Серпухов', '4983'], ['Смоленск', '4614'], ['Сочи', '4998'], ['Ставрополь', '4615'], ['Сургут', '5003'], ['Сыктывкар', '4582'], ['Тамбов', '4617'], ['Тверь', '4619'], ['Тольятти', '5015'], ['Томск', '4620'], ['Тула', '4621'], ['Тюмень', '4623'], ['Улан-Удэ', '4563'], ['Ульяновск', '4625'], ['Уфа', '4560'], ['Фрязино', '5038'], ['Хабаровск', '4627'], ['Ханты-Мансийск', '4629'], ['Химки', '5044'], ['Чебоксары', '4633'], ['Челябинск', '4630'], ['Череповец', '5050'], ['Черкесск', '4578'], ['Чита', '4720'], ['Электросталь', '5064'], ['Элиста', '4575'], ['Южно-Сахалинск', '4611'], ['Якутск', '4610'], ['Ярославль', '4636']]
 
+CITY_ALIASES = {
+    "Moscow": "Москва",
+    "Saint Petersburg": "Санкт-Петербург",
+    "St Petersburg": "Санкт-Петербург",
+    "Петербург": "Санкт-Петербург",
+    "Питер": "Санкт-Петербург",
+    "СПб": "Санкт-Петербург",
+    "Rostov-on-Don": "Ростов-На-Дону",
+    "Togliatti": "Тольятти",
+}
+
 SPECIFIC_WORD_LABELS = {
     'хорош',
     'рядом',
@@ -36,3 +55,57 @@ NOT_STREET_ADDRESS_ELEMENTS = {"ЖК", "м.", "мкр.", "Жилой компл
 SPECIFIC_FIELDS_FOR_RENT_LONG = {"price_per_month", "commissions"}
 SPECIFIC_FIELDS_FOR_RENT_SHORT = {"price_per_day"}
 SPECIFIC_FIELDS_FOR_SALE = {"price", "residential_complex"}
+
+FIELDS_OF_OFFER = [
+    "author", "author_type", "link", "city", "deal_type", "accommodation_type",
+    "floor", "floors_count", "rooms_count", "total_meters",
+    "price_per_month", "commissions", "price_per_day", "price", "price_per_m2",
+    "year_of_construction", "living_meters", "kitchen_meters", "phone", "latitude", "longitude",
+    "address", "residential_complex",
+]
+
+TYPES_OF_FIELDS = {
+    "author": str, "author_type": str, "link": str, "city": str, "deal_type": str, "accommodation_type": str,
+    "floor": int, "floors_count": int, "rooms_count": int, "total_meters": float,
+    "price_per_month": int, "commissions": int, "price_per_day": int, "price": int, "price_per_m2": int,
+    "year_of_construction": int, "living_meters": float, "kitchen_meters": float, "phone": str,
+    "latitude": float, "longitude": float,
+    "address": str, "residential_complex": str,
+}
+
+# fields of offer in the rows of its card
+SPECIFICATION_FIELDS = ("floor", "floors_count", "rooms_count", "total_meters")
+
+OUTPUT_FORMATS = ("csv", "parquet", "sqlite")
+
+LATIN_FIELDS = ("author", "city", "address", "residential_complex")
+TRANSLITERATION_CACHE_SIZE = 4096
+
+# count of offers found by the query: in the results of the json state of listing page or in its summary header
+COUNT_OF_OFFERS_KEYS = ("aggregatedOffers", "totalOffers", "offersCount")
+COUNT_OF_OFFERS_REG_EXPRESSION = r"Найден[оа]?\s+(\d[\d\s]*?)\s*объявлени"
+SUMMARY_HEADER_SELECTORS = ("div[data-name='SummaryHeader']", "div[data-name='HeaderDefault']")
+MAX_COUNT_OF_PAGES = 54
+COUNT_OF_OFFERS_PER_PAGE = 28
+# bands of price and of total area above these limits are not split further
+MAX_PRICE_OF_SHARD = 10 ** 10
+MAX_TOTAL_AREA_OF_SHARD = 1000
+
+# pages without any of these markers (captcha, throttling, errors) are not stored in ResponseCache
+LISTING_PAGE_MARKERS = ('data-name="CardComponent"',)
+OFFER_PAGE_MARKERS = ('data-name="OfferTitle"', 'data-name="ObjectSummaryDescription"', '"cianId"')
+
+LINK_AREA_SELECTOR = "div[data-name='LinkArea']"
+CARD_ROW_SELECTOR = "div[data-name='GeneralInfoSectionRowComponent']"
+# labels of author in spans of card by priority: the first of them found in card defines type of author,
+# the next span is the name of author
+AUTHOR_TYPES = (
+    ("Агентство недвижимости", "real_estate_agent"),
+    ("Собственник", "homeowner"),
+    ("Риелтор", "realtor"),
+    ("Ук・оф.Представитель", "official_representative"),
+    ("Представитель застройщика", "representative_developer"),
+    ("Застройщик", "developer"),
+)
+
+OFFER_PAGE_LABELS = {"Год постройки", "Год сдачи", "Площадь кухни", "Жилая площадь", "Этаж"}
@@ -1,9 +1,16 @@
-import requests
-from bs4 import BeautifulSoup
-import pymorphy2
+import argparse
 import collections
 import csv
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import cloudscraper
+import pymorphy2
+from bs4 import BeautifulSoup
+
+from cianparser.constants import CITIES, HEADERS
+from cianparser.rate_limiter import RateLimiter
 
 ParseCityNames = collections.namedtuple(
     'ParseResults',
@@ -13,14 +20,30 @@ ParseCityNames = collections.namedtuple(
     }
 )
 
+FIRST_REGION_ID = 4550
+LAST_REGION_ID = 6000
+REGION_URL = 'https://www.cian.ru/cat.php?deal_type=rent&engine_version=2&offer_type=flat&p=1&region={}&type=4'
+
 
 class Client:
-    def __init__(self):
+    """Finds names of cities by probing region ids of cian concurrently.
+
+    Every probed region is appended to checkpoint_path at once, so an interrupted run resumes from it.
+    """
+
+    def __init__(self, max_workers: int = 8, rate_limiter: RateLimiter = None,
+                 checkpoint_path: str = "cities_checkpoint.csv"):
         self.session = cloudscraper.create_scraper()
-        self.session.headers = {'Accept-Language': 'en'}
+        self.session.headers = dict(HEADERS)
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter(requests_per_second=2, burst=4)
+        self.checkpoint_path = checkpoint_path
+        self.morph = pymorphy2.MorphAnalyzer()
 
         self.cities = []
         self.cities_set = set()
+        self.probed_locations = dict()
+        self._morph_lock = threading.Lock()
 
     def define_city(self, html, location):
         soup = BeautifulSoup(html, 'html.parser')
@@ -30,26 +53,42 @@ class Client:
         city = title[:title.find('Аренда')].split()[-1]
         if city == "России":
             print(location)
-            return self.cities
+            return None
 
-        morph = pymorphy2.MorphAnalyzer()
-        city = morph.parse(city)[0].normal_form.title()
+        with self._morph_lock:
+            city = self.morph.parse(city)[0].normal_form.title()
         print(city + " " + str(location))
-
-        if city not in self.cities_set:
-            self.cities_set.add(city)
-            self.cities.append((city, location))
-
-        return self.cities
-
-    def define_all_cities(self):
-        for location in range(4550, 6000):
-            path = f'https://www.cian.ru/cat.php?deal_type=rent&engine_version=2&offer_type=flat&p=1&region={location}&type=4'
-            response = requests.get(path)
-            html = response.text
-            self.define_city(html, location)
-
-        self.cities = sorted(self.cities, key=lambda x: x[0])
+        return city
+
+    def define_all_cities(self, first_location: int = FIRST_REGION_ID, last_location: int = LAST_REGION_ID):
+        self._load_checkpoint()
+        locations = [
+            location for location in range(first_location, last_location)
+            if location not in self.probed_locations
+        ]
+        print(f"Regions to probe: {len(locations)}, already probed: {len(self.probed_locations)}")
+
+        with open(self.checkpoint_path, 'a', newline='', encoding='utf-8') as checkpoint_file:
+            checkpoint_writer = csv.writer(checkpoint_file, delimiter=';')
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            try:
+                futures = {executor.submit(self._probe, location): location for location in locations}
+                for future in as_completed(futures):
+                    location = futures[future]
+                    try:
+                        city = future.result()
+                    except Exception as exc:
+                        print(f"Exception for region {location}: {exc}, it will be probed on the next run")
+                        continue
+
+                    self.probed_locations[location] = city
+                    checkpoint_writer.writerow([location, city or ''])
+                    checkpoint_file.flush()
+            finally:
+                # on KeyboardInterrupt or exception the queued probes are dropped, only running ones are waited for
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        self._define_cities()
 
     def save_results(self):
         cities_result = []
@@ -70,8 +109,64 @@ class Client:
             for item in self.cities:
                 writer.writerow(item)
 
+    def save_constants(self, path="cities_constants.py", first_location: int = FIRST_REGION_ID,
+                       last_location: int = LAST_REGION_ID):
+        """Write CITIES in the format of cianparser/constants.py, cities of regions out of probed range are kept."""
+        cities = {
+            city_name: location_id for city_name, location_id in CITIES
+            if not first_location <= int(location_id) < last_location
+        }
+        for city_name, location in self.cities:
+            cities.setdefault(city_name, str(location))
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"CITIES = {[[city_name, cities[city_name]] for city_name in sorted(cities)]}\n")
+
+    def _probe(self, location):
+        self.rate_limiter.acquire()
+        response = self.session.get(REGION_URL.format(location))
+        if response.status_code == 429 or 'Captcha' in response.text:
+            self.rate_limiter.report_throttling()
+            raise Exception('Captcha')
+        response.raise_for_status()
+        self.rate_limiter.report_success()
+        return self.define_city(response.text, location)
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return
+
+        with open(self.checkpoint_path, newline='', encoding='utf-8') as checkpoint_file:
+            for location, city in csv.reader(checkpoint_file, delimiter=';'):
+                self.probed_locations[int(location)] = city or None
+
+    def _define_cities(self):
+        """The same city may be found in several regions, the smallest region id is taken."""
+        self.cities = []
+        self.cities_set = set()
+        for location, city in sorted(self.probed_locations.items()):
+            if city is not None and city not in self.cities_set:
+                self.cities_set.add(city)
+                self.cities.append((city, location))
+
+        self.cities = sorted(self.cities, key=lambda x: x[0])
+
 
 if __name__ == '__main__':
-    definer = Client()
-    definer.define_all_cities()
-    definer.save_results()
\ No newline at end of file
+    arguments_parser = argparse.ArgumentParser(description='Find names of cities of cian regions')
+    arguments_parser.add_argument('--first', type=int, default=FIRST_REGION_ID, help='first region id to probe')
+    arguments_parser.add_argument('--last', type=int, default=LAST_REGION_ID, help='region id to stop before')
+    arguments_parser.add_argument('--workers', type=int, default=8, help='count of concurrent requests')
+    arguments_parser.add_argument('--requests-per-second', type=float, default=2, help='limit of requests rate')
+    arguments_parser.add_argument('--checkpoint', default='cities_checkpoint.csv', help='file with probed regions')
+    arguments_parser.add_argument('--output', default='cities_constants.py', help='file with regenerated CITIES')
+    arguments = arguments_parser.parse_args()
+
+    definer = Client(
+        max_workers=arguments.workers,
+        rate_limiter=RateLimiter(requests_per_second=arguments.requests_per_second, burst=arguments.workers),
+        checkpoint_path=arguments.checkpoint,
+    )
+    definer.define_all_cities(arguments.first, arguments.last)
+    definer.save_results()
+    definer.save_constants(arguments.output, arguments.first, arguments.last)
@@ -1,3 +1,29 @@
+import functools
+import re
+
+from cianparser.constants import COUNT_OF_OFFERS_REG_EXPRESSION, SUMMARY_HEADER_SELECTORS, TRANSLITERATION_CACHE_SIZE
+from cianparser.json_state import extract_count_of_offers
+
+COUNT_OF_OFFERS_PATTERN = re.compile(COUNT_OF_OFFERS_REG_EXPRESSION)
+
+
+def define_count_of_offers(html: str, document) -> int:
+    """Count of offers found by the query of listing page, -1 if the page does not report it.
+
+    It is read from the results of the json state, otherwise from the summary in the header of the page.
+    """
+    count_of_offers = extract_count_of_offers(html)
+    if count_of_offers != -1:
+        return count_of_offers
+
+    for selector in SUMMARY_HEADER_SELECTORS:
+        for header in document.select(selector):
+            match = COUNT_OF_OFFERS_PATTERN.search(header.text)
+            if match is not None:
+                return int(re.sub(r"\D", "", match.group(1)))
+    return -1
+
+
 def define_rooms_count(description: str) -> int:
     if "1-комн" in description or "Студия" in description:
         rooms_count = 1
@@ -15,6 +41,14 @@ def define_rooms_count(description: str) -> int:
     return rooms_count
 
 
+@functools.lru_cache(maxsize=TRANSLITERATION_CACHE_SIZE)
+def transliterate_to_latin(text: str) -> str:
+    """Cached for all parsers: cities, metro stations and agencies repeat in almost every record."""
+    import transliterate
+
+    return transliterate.translit(text, 'ru', reversed=True)
+
+
 def define_id_url(url: str) -> str:
     url_path_elements = url.split("/")
     if len(url_path_elements[-1]) > 3:
@@ -0,0 +1,128 @@
+import json
+
+from cianparser.constants import COUNT_OF_OFFERS_KEYS
+
+STATE_MARKER = ".concat("
+PAGE_DATA_FIELDS = (
+    "total_meters", "year_of_construction", "living_meters", "kitchen_meters", "floor", "floors_count",
+    "rooms_count", "phone", "latitude", "longitude",
+)
+
+_decoder = json.JSONDecoder()
+
+
+def extract_offers_state(html: str) -> dict:
+    """Find offers in the json state embedded into inline scripts of cian pages, without building a DOM.
+
+    Cian pages push their state as `window._cianConfig[...] = (...).concat([...])`, every offer there is
+    an object with "cianId". Returns typed fields of offers by offer id, empty dict if there is no state.
+    """
+    offers = dict()
+    for state in _iter_states(html):
+        for offer in _find_offers(state):
+            fields = define_offer_fields(offer)
+            offers[fields["offer_id"]] = fields
+    return offers
+
+
+def extract_count_of_offers(html: str) -> int:
+    """Count of offers found by the query in the results of the json state, -1 if there is no state.
+
+    It is taken only from the object with the list of offers, counts of residential complexes and other
+    blocks of the page are ignored.
+    """
+    for state in _iter_states(html):
+        stack = [state]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, dict):
+                if isinstance(item.get("offers"), list):
+                    for key in COUNT_OF_OFFERS_KEYS:
+                        if isinstance(item.get(key), int):
+                            return item[key]
+                stack.extend(item.values())
+            elif isinstance(item, list):
+                stack.extend(reversed(item))
+    return -1
+
+
+def define_offer_fields(offer: dict) -> dict:
+    building = offer.get("building") or dict()
+    bargain_terms = offer.get("bargainTerms") or dict()
+    coordinates = (offer.get("geo") or dict()).get("coordinates") or dict()
+
+    price = bargain_terms.get("priceRur", bargain_terms.get("price"))
+    phone = ""
+    for phone_data in offer.get("phones") or []:
+        if phone_data.get("number"):
+            phone = f"+{phone_data.get('countryCode', '7')}{phone_data['number']}"
+            break
+
+    return {
+        "offer_id": str(offer["cianId"]),
+        "link": offer.get("fullUrl", ""),
+        "price": _to_int(price),
+        "commissions": _to_int(bargain_terms.get("agentFee") or 0),
+        "total_meters": _to_float(offer.get("totalArea")),
+        "living_meters": _to_float(offer.get("livingArea")),
+        "kitchen_meters": _to_float(offer.get("kitchenArea")),
+        "floor": _to_int(offer.get("floorNumber")),
+        "floors_count": _to_int(building.get("floorsCount")),
+        "rooms_count": _to_int(offer.get("roomsCount")),
+        "year_of_construction": _to_int(building.get("buildYear")),
+        "latitude": _to_float(coordinates.get("lat")),
+        "longitude": _to_float(coordinates.get("lng")),
+        "phone": phone,
+    }
+
+
+def define_page_data(offer_fields: dict) -> dict:
+    """Fields of offer in the format of ParserOffers._parse_page_offer, only those present in the state.
+
+    Missing fields (-1 or empty phone) are left out, so they do not overwrite values taken from the card.
+    Price and commissions are left out: the field of price depends on the deal type, it is set by Offer.set_price.
+    """
+    return {
+        field: offer_fields[field] for field in PAGE_DATA_FIELDS
+        if offer_fields[field] != -1 and offer_fields[field] != ""
+    }
+
+
+def _iter_states(html: str):
+    position = html.find(STATE_MARKER)
+    while position != -1:
+        start = position + len(STATE_MARKER)
+        try:
+            state, end = _decoder.raw_decode(html, start)
+        except ValueError:
+            end = start
+        else:
+            yield state
+        position = html.find(STATE_MARKER, end)
+
+
+def _find_offers(state):
+    stack = [state]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            if "cianId" in item and ("bargainTerms" in item or "totalArea" in item):
+                yield item
+            else:
+                stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+
+
+def _to_int(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return -1
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return -1
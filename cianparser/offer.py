@@ -0,0 +1,112 @@
+from collections.abc import Mapping
+
+from cianparser.constants import (
+    FIELDS_OF_OFFER, SPECIFIC_FIELDS_FOR_RENT_LONG, SPECIFIC_FIELDS_FOR_RENT_SHORT, SPECIFIC_FIELDS_FOR_SALE,
+)
+
+SPECIFIC_FIELDS = SPECIFIC_FIELDS_FOR_RENT_LONG | SPECIFIC_FIELDS_FOR_RENT_SHORT | SPECIFIC_FIELDS_FOR_SALE
+
+_MISSING = object()
+
+
+def _define_fields(specific_fields: set) -> tuple:
+    return tuple(field for field in FIELDS_OF_OFFER if field not in SPECIFIC_FIELDS or field in specific_fields)
+
+
+class Offer(Mapping):
+    """Parsed announcement with fields in slots instead of a dict per record.
+
+    It is kept by parsers while they crawl and is a read-only mapping of its own fields. Parsing functions return
+    to_dict(), a plain dict with the keys of records before Offer, see LEGACY_FIELDS. Fields, which were not found
+    (e.g. page data in express mode), are absent.
+    """
+
+    __slots__ = tuple(field for field in FIELDS_OF_OFFER if field not in SPECIFIC_FIELDS)
+    FIELDS = __slots__
+    PRICE_FIELD = None
+
+    def set_price(self, price: int, commissions: int) -> None:
+        setattr(self, self.PRICE_FIELD, price)
+
+    @property
+    def price_value(self) -> int:
+        return getattr(self, self.PRICE_FIELD)
+
+    def update(self, page_data: dict) -> None:
+        for field, value in page_data.items():
+            setattr(self, field, value)
+
+    # keys of records of the deal type, which are not fields of the offer: price field name -> default value,
+    # None is the value of the price of offer
+    LEGACY_FIELDS = dict()
+
+    def to_dict(self) -> dict:
+        """Plain dict of the offer with the same keys as records had before Offer."""
+        record = self._define_fields_dict()
+        for field, value in self.LEGACY_FIELDS.items():
+            record[field] = self.price_value if value is None else value
+        return record
+
+    def _define_fields_dict(self) -> dict:
+        record = dict()
+        for field in self.FIELDS:
+            value = getattr(self, field, _MISSING)
+            if value is not _MISSING:
+                record[field] = value
+        return record
+
+    def __getitem__(self, field: str):
+        if field in self.FIELDS:
+            value = getattr(self, field, _MISSING)
+            if value is not _MISSING:
+                return value
+        raise KeyError(field)
+
+    def __iter__(self):
+        for field in self.FIELDS:
+            if getattr(self, field, _MISSING) is not _MISSING:
+                yield field
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._define_fields_dict()!r})"
+
+    def __getstate__(self):
+        return self._define_fields_dict()
+
+    def __setstate__(self, state):
+        self.update(state)
+
+
+class SaleOffer(Offer):
+    __slots__ = tuple(field for field in FIELDS_OF_OFFER if field in SPECIFIC_FIELDS_FOR_SALE)
+    FIELDS = _define_fields(SPECIFIC_FIELDS_FOR_SALE)
+    PRICE_FIELD = "price"
+    LEGACY_FIELDS = {"price_per_month": -1, "commissions": 0}
+
+
+class RentLongOffer(Offer):
+    __slots__ = tuple(field for field in FIELDS_OF_OFFER if field in SPECIFIC_FIELDS_FOR_RENT_LONG)
+    FIELDS = _define_fields(SPECIFIC_FIELDS_FOR_RENT_LONG)
+    PRICE_FIELD = "price_per_month"
+
+    def set_price(self, price: int, commissions: int) -> None:
+        self.price_per_month = price
+        self.commissions = commissions
+
+
+class RentShortOffer(Offer):
+    __slots__ = tuple(field for field in FIELDS_OF_OFFER if field in SPECIFIC_FIELDS_FOR_RENT_SHORT)
+    FIELDS = _define_fields(SPECIFIC_FIELDS_FOR_RENT_SHORT)
+    PRICE_FIELD = "price_per_day"
+    LEGACY_FIELDS = {"price_per_month": -1, "commissions": 0, "price": None}
+
+
+def define_offer_class(deal_type: str, rent_type: int = None):
+    if deal_type == "sale":
+        return SaleOffer
+    if rent_type == 2:
+        return RentShortOffer
+    return RentLongOffer
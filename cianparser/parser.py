@@ -1,45 +1,107 @@
-import cloudscraper
-import csv
-import itertools
 import math
 import pathlib
 import re
-import time
-import transliterate
 from abc import ABC
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from cianparser.backends import PARSER_BACKENDS, make_document
+from cianparser.checkpoint import Checkpoint
 from cianparser.constants import *
-from cianparser.helpers import define_id_url, define_rooms_count
+from cianparser.helpers import define_count_of_offers, define_id_url, define_rooms_count, transliterate_to_latin
+from cianparser.json_state import define_page_data, extract_offers_state
+from cianparser.offer import define_offer_class
+from cianparser.rate_limiter import RateLimiter
+from cianparser.sinks import CsvSink, LatinSink, ParquetSink, SqliteSink
+from cianparser.stats import CrawlStats
+
+FLOATS_NUMBERS_PATTERN = re.compile(FLOATS_NUMBERS_REG_EXPRESSION)
+INTEGERS_PATTERN = re.compile(INTEGERS_REG_EXPRESSION)
+AUTHOR_TYPE_RANKS = {label: rank for rank, (label, _) in enumerate(AUTHOR_TYPES)}
 
 
 class ParserOffers(ABC):
     def __init__(self, deal_type: str, accommodation_type: str, city_name: str,
                  start_page: int, end_page: int, is_saving_csv=False, is_latin=False,
                  is_express_mode=False, is_by_homeowner=False,
-                 data_dir_path=None):
+                 data_dir_path=None, csv_flush_every=1,
+                 max_workers=1, rate_limiter=None, seen_index=None,
+                 response_cache=None, parser_backend="bs4", stats=None, output_format="csv", resume=None,
+                 session_pool=None):
 
         self.accommodation_type = accommodation_type
         self.city_name = city_name
         self.start_page = start_page
         self.end_page = end_page
+        self.last_page = end_page
+        self.count_of_offers = None
         self.is_saving_csv = is_saving_csv
+        if is_latin not in (True, False, "sink"):
+            raise ValueError(f'You entered is_latin={is_latin}, which is not valid value. '
+                             f'Try entering one of these values: True, False, "sink".')
+        if is_latin == "sink" and not is_saving_csv:
+            raise ValueError(f'You entered is_latin={is_latin} with is_saving_csv={is_saving_csv}, which is not valid '
+                             f'value. Try entering one of these values: True, False or is_saving_csv=True.')
         self.is_latin = is_latin
         self.is_express_mode = is_express_mode
         self.is_by_homeowner = is_by_homeowner
         self.data_dir_path = data_dir_path
+        self.csv_flush_every = csv_flush_every
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f'You entered output_format={output_format}, which is not valid value. '
+                             f'Try entering one of these values: "csv", "parquet", "sqlite".')
+        self.output_format = output_format
+        if resume and output_format == "parquet":
+            raise ValueError(f'You entered output_format={output_format} with resume, which is not valid value. '
+                             f'Try entering one of these values: "csv", "sqlite".')
+        self.checkpoint = Checkpoint(resume) if resume else None
+        self.max_workers = max_workers
         self._set_deal_type(deal_type)
+        self.offer_class = define_offer_class(self.deal_type, self.rent_type)
         self._set_file_path()
-
-        self.session = cloudscraper.create_scraper()
-        self.session.headers = {'Accept-Language': 'en'}
+        self.sink = None
+        self.executor = None
+        self.prefetch_executor = None
+        self._prefetched_page = None
+
+        self.session_pool = session_pool
+        self._session = session_pool
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(requests_per_second=0) if session_pool is not None else RateLimiter()
+        self.rate_limiter = rate_limiter
+        self.seen_index = seen_index
+        self.response_cache = response_cache
+        if parser_backend not in PARSER_BACKENDS:
+            raise ValueError(f'You entered parser_backend={parser_backend}, which is not valid value. '
+                             f'Try entering one of these values: "bs4", "lxml", "selectolax".')
+        self.parser_backend = parser_backend
+        self.stats = stats if stats is not None else CrawlStats()
         self.result_parsed = set()
+        # ids of offers parsed after the last saved checkpoint
+        self.offer_ids_to_checkpoint = []
+        self.offers_state = dict()
         self.result = list()
         self.parsed_announcements_count = 0
         self.average_price = 0
         self.url = None
 
+    @property
+    def session(self):
+        """Cloudscraper session, it is created on the first request, so cloudscraper is imported only then.
+
+        If session_pool is given, it is used as the session.
+        """
+        if self._session is None:
+            import cloudscraper
+
+            self._session = cloudscraper.create_scraper()
+            self._session.headers = dict(HEADERS)
+        return self._session
+
+    @session.setter
+    def session(self, session) -> None:
+        self._session = session
+
     def is_rent_long(self) -> bool:
         return self.deal_type == "rent" and self.rent_type == 4
 
@@ -50,30 +112,112 @@ class ParserOffers(ABC):
         return self.deal_type == "sale"
 
     def run(self) -> None:
+        for record in self.iter_results():
+            self.result.append(record)
+
+    def iter_results(self):
+        """Parse pages and yield every announcement as soon as it is parsed.
+
+        Announcements are kept in get_results() only by run(), so memory does not grow with the number of pages.
+        """
         print(f"\n{' ' * 30}Preparing to collect information from pages..")
+        self._load_checkpoint()
+        self._open_sink()
+        if not self.is_express_mode and self.max_workers > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=1)
+
+        try:
+            yield from self._iter_pages()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+            self._cancel_prefetch()
+            self.prefetch_executor.shutdown()
+            self.prefetch_executor = None
+            self._close_sink()
+            self.stats.dump()
+
+        self._remove_checkpoint()
+        self._print_summary()
+
+    def _open_sink(self) -> None:
         if self.is_saving_csv:
             print(f"The absolute path to the file:\n{self.file_path}\n")
+            if self.output_format == "parquet":
+                self.sink = ParquetSink(self.file_path, self._define_fieldnames())
+            elif self.output_format == "sqlite":
+                self.sink = SqliteSink(self.file_path)
+            else:
+                self.sink = CsvSink(self.file_path, self._define_fieldnames(), flush_every=self.csv_flush_every)
+                if self.checkpoint is not None and self.checkpoint.exists():
+                    self.sink.truncate(self.checkpoint.sink_position)
+            if self.is_latin == "sink":
+                self.sink = LatinSink(self.sink)
+            self.sink.open()
+
+    def _close_sink(self) -> None:
+        if self.sink is not None:
+            self.sink.close()
+        if self.seen_index is not None:
+            self.seen_index.flush()
+
+    def _load_checkpoint(self) -> None:
+        """Continue the crawl saved in checkpoint: its file, parsed offers and aggregates; skip completed pages."""
+        if self.checkpoint is None:
+            return
 
-        attempt_number_exception = 0
-        for number_page in range(self.start_page, self.end_page + 1):
-            while attempt_number_exception < 3:
-                try:
-                    attempt_number = 0
-                    parsed, attempt_number, end = self._load_and_parse_page(
-                        number_page=number_page,
-                        count_of_pages=self.end_page+1-self.start_page,
-                        attempt_number=attempt_number,
-                    )
-                    break
-                except Exception as exc:
-                    attempt_number_exception += 1
-                    print(f"\n\nException: {exc}")
-                    time.sleep(2)
-                    print(f'Retrying. Attempt number {attempt_number_exception}')
-                    break
-            if attempt_number_exception == 3:
-                raise Exception('Couldn\'t parse cian.ru')
+        url = self._build_url(self.start_page)
+        if not self.checkpoint.exists():
+            self.checkpoint.remove()
+            self.checkpoint.url = url
+            self.checkpoint.file_path = str(self.file_path)
+            return
+
+        self.checkpoint.load()
+        if self.checkpoint.url != url:
+            raise ValueError(f'Checkpoint {self.checkpoint.path} was saved by the crawl of {self.checkpoint.url}, '
+                             f'it can not be continued by the crawl of {url}')
+
+        self.file_path = pathlib.Path(self.checkpoint.file_path)
+        self.result_parsed = self.checkpoint.seen_offer_ids
+        self.parsed_announcements_count = self.checkpoint.parsed_announcements_count
+        self.average_price = self.checkpoint.average_price
+        print(f"Resuming the crawl from checkpoint {self.checkpoint.path}: "
+              f"{len(self.checkpoint.completed_pages)} pages and {self.parsed_announcements_count} announcements "
+              f"are already parsed")
+
+    def _save_checkpoint(self, number_page: int) -> None:
+        """Called after every completed page: output file and seen index are flushed before the checkpoint,
+        so they never contain announcements which are not in it.
+        """
+        if self.checkpoint is None:
+            return
 
+        if self.sink is not None:
+            self.sink.flush()
+            self.checkpoint.sink_position = self.sink.bytes_written
+            self.checkpoint.count_written = self.sink.count_written
+        new_offer_ids, self.offer_ids_to_checkpoint = self.offer_ids_to_checkpoint, []
+        if self.seen_index is not None:
+            for offer_id in new_offer_ids:
+                self.seen_index.add(offer_id)
+            self.seen_index.flush()
+        self.checkpoint.add_offer_ids(new_offer_ids)
+        self.checkpoint.completed_pages.add(number_page)
+        self.checkpoint.parsed_announcements_count = self.parsed_announcements_count
+        self.checkpoint.average_price = self.average_price
+        self.checkpoint.save()
+
+    def _remove_checkpoint(self) -> None:
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
+
+    def _is_page_completed(self, number_page: int) -> bool:
+        return self.checkpoint is not None and number_page in self.checkpoint.completed_pages
+
+    def _print_summary(self) -> None:
         print(f"\n\nThe collection of information from the pages with list of announcements is completed")
         print(f"Total number of parsed announcements: {self.parsed_announcements_count}. ", end="")
         more_precise = ''
@@ -83,8 +227,42 @@ class ParserOffers(ABC):
             more_precise = 'per day'
         print(f"Average price {more_precise}: {'{:,}'.format(int(self.average_price)).replace(',', ' ')} rub")
 
-    def get_results(self):
-        return self.result
+    def _iter_pages(self):
+        """Records of pages with list, a failed page is parsed again up to 3 times before the crawl is aborted.
+
+        Announcements of the failed attempt which were parsed already are skipped by the next one.
+        """
+        number_page = self._define_next_page(self.start_page - 1)
+        while number_page is not None:
+            for attempt_number in range(1, 4):
+                try:
+                    yield from self._iter_load_and_parse_page(
+                        number_page=number_page,
+                        count_of_pages=self.last_page+1-self.start_page,
+                    )
+                    self._save_checkpoint(number_page)
+                    break
+                except Exception as exc:
+                    self.stats.increment("retries")
+                    print(f"\n\nException: {exc}")
+                    self.rate_limiter.report_throttling()
+                    if self.response_cache is not None and self.url is not None:
+                        self.response_cache.delete(self.url)
+                    print(f'Retrying. Attempt number {attempt_number}')
+            else:
+                raise Exception('Couldn\'t parse cian.ru')
+            number_page = self._define_next_page(number_page)
+
+    def _define_next_page(self, number_page: int):
+        """The page after number_page which is not completed yet, None if number_page is the last one."""
+        next_page = number_page + 1
+        while self._is_page_completed(next_page):
+            next_page += 1
+        return next_page if next_page <= self.last_page else None
+
+    def get_results(self) -> list:
+        """Announcements parsed by run() as plain dicts, see Offer.to_dict."""
+        return [record.to_dict() for record in self.result]
 
     def _set_deal_type(self, deal_type: str) -> None:
         self.rent_type = None
@@ -102,55 +280,129 @@ class ParserOffers(ABC):
             self.data_dir_path = pathlib.Path('data/')
             self.data_dir_path.mkdir(parents=False, exist_ok=True)
 
-        city_name = transliterate.translit(self.city_name.lower(), reversed=True).replace("'", "")
+        if self.output_format == "sqlite":
+            self.file_path = pathlib.Path(self.data_dir_path, 'cian.sqlite')
+            return
+
+        city_name = transliterate_to_latin(self.city_name.lower()).replace("'", "")
         now_time = datetime.now().strftime('%d_%b_%Y_%H_%M_%S_%f')
         file_name = '_'.join(map(str, [self.deal_type, self.start_page, self.end_page, city_name, now_time]))
-        self.file_path = pathlib.Path(self.data_dir_path, f'cian_{file_name}.csv')
+        self.file_path = pathlib.Path(self.data_dir_path, f'cian_{file_name}.{self.output_format}')
 
-    def _load_and_parse_page(self, number_page, count_of_pages, attempt_number):
+    def _iter_load_and_parse_page(self, number_page, count_of_pages):
         html = self._load_page(number_page)
-        return self._parse_page(
-            html=html,
-            number_page=number_page,
-            count_of_pages=count_of_pages,
-            attempt_number=attempt_number,
-        )
+        offers = self._select_offers(html, number_page)
+        if offers is None:
+            return
+
+        self._prefetch_page(self._define_next_page(number_page))
+        yield from self._iter_parse_offers(offers, number_page, count_of_pages)
 
     def _load_page(self, number_page: int = 1) -> str:
         self.url = self._build_url(number_page)
-        res = self.session.get(url=self.url)
+        if self._prefetched_page is not None and self._prefetched_page[0] == number_page:
+            # a failed prefetch is dropped too, so that the retry of the page requests it again
+            prefetched_html = self._prefetched_page[1]
+            self._prefetched_page = None
+            return prefetched_html.result()
+
+        self._cancel_prefetch()
+        return self._get(self.url)
+
+    def _prefetch_page(self, number_page) -> None:
+        """Start loading the next page with list while cards of the current one are parsed."""
+        if self.prefetch_executor is None or number_page is None:
+            return
+
+        self._prefetched_page = (number_page, self.prefetch_executor.submit(self._get, self._build_url(number_page)))
+
+    def _cancel_prefetch(self) -> None:
+        if self._prefetched_page is not None:
+            self._prefetched_page[1].cancel()
+            self._prefetched_page = None
+
+    def _get(self, url: str, is_page_offer: bool = False) -> str:
+        if self.response_cache is not None:
+            html = self.response_cache.get(url, is_page_offer)
+            if html is not None:
+                self.stats.increment("cache_hits")
+                return html
+
+        with self.stats.measure("rate_limit_wait"):
+            self.rate_limiter.acquire()
+        with self.stats.measure("offer_fetch" if is_page_offer else "listing_fetch"):
+            if self.session_pool is not None:
+                res = self.session_pool.get(url, stats=self.stats)
+            else:
+                res = self.session.get(url=url)
+                self.stats.increment("requests")
+                self.stats.increment("bytes", len(res.content))
         res.raise_for_status()
+        self.rate_limiter.report_success()
+        if self.response_cache is not None:
+            self.response_cache.put(url, res.text, is_page_offer)
         return res.text
 
     def _build_url(self, number_page: int) -> str:
         pass
 
     def _parse_page(self, html: str, number_page: int, count_of_pages: int, attempt_number: int):
+        for record in self._iter_parse_page(html, number_page, count_of_pages):
+            self.result.append(record)
+        return True, 0, True
+
+    def _iter_parse_page(self, html: str, number_page: int, count_of_pages: int):
+        offers = self._select_offers(html, number_page)
+        if offers is None:
+            return
+
+        yield from self._iter_parse_offers(offers, number_page, count_of_pages)
+
+    def _iter_parse_offers(self, offers, number_page: int, count_of_pages: int):
+        pages_data = self._submit_pages_offer(offers)
         try:
-            soup = BeautifulSoup(html, 'lxml')
-        except:
-            soup = BeautifulSoup(html, 'html.parser')
+            for ind, block in enumerate(offers):
+                record = None
+                if pages_data is None or pages_data[ind] is None:
+                    record = self._parse_block(block)
+                else:
+                    record = self._parse_block(block, page_data=pages_data[ind].result())
+
+                self._print_progress(number_page, count_of_pages, ind, offers)
+                if record is not None:
+                    yield record
+        finally:
+            for page_data in pages_data or []:
+                if page_data is not None:
+                    page_data.cancel()
 
-        with open('meow.html', 'w') as meow:
-            meow.write(soup.text)
+    def _select_offers(self, html: str, number_page: int):
+        """Check listing page and return its cards, or None if the page is past the last one.
+
+        The first checked page sizes the crawl: last_page is lowered to the count of pages of found offers.
+        """
+        with self.stats.measure("listing_parse"):
+            soup = make_document(html, self.parser_backend)
+            offers = soup.select("article[data-name='CardComponent']")
 
         if 'Captcha' in soup.text:
+            self.stats.increment("captchas")
             raise Exception('Captcha')
-            return False, attempt_number + 1, True
 
         header = soup.select("div[data-name='HeaderDefault']")
         if len(header) == 0:
             raise Exception('Empty header')
-            return False, attempt_number + 1, True
 
-        offers = soup.select("article[data-name='CardComponent']")
         page_number_html = soup.select("button[data-name='PaginationButton']")
         if len(page_number_html) == 0:
             raise Exception('Can\'t find page number')
-            return False, attempt_number + 1, True
 
         if page_number_html[0].text == "Назад" and (number_page != 1 and number_page != 0):
-            return True, 0, True
+            self.last_page = min(self.last_page, number_page - 1)
+            return None
+
+        if self.count_of_offers is None:
+            self._define_last_page(html, soup, len(offers))
 
         if number_page == self.start_page:
             print(f"The page from which the collection of information begins: \n {self.url} \n")
@@ -159,265 +411,253 @@ class ParserOffers(ABC):
         print("")
         print(f"\r {number_page} page: {len(offers)} offers", end="\r", flush=True)
 
-        for ind, block in enumerate(offers):
-            self._parse_block(block)
-
-            if not self.is_express_mode:
-                time.sleep(4)
-
-            total_planed_announcements = len(offers) * count_of_pages
-            print(
-                f"\b" * 200 +
-                f"\r {number_page - self.start_page + 1} | {number_page} page with list: [" +
-                "=>" * (ind + 1) + "  " * (len(offers) - ind - 1) + "]" +
-                f" {math.ceil((ind + 1) * 100 / len(offers))}" + "%" +
-                f" | Count of all parsed: {self.parsed_announcements_count}."
-                f" Progress ratio: {math.ceil(self.parsed_announcements_count * 100 / total_planed_announcements)} %."
-                f" Average price: {'{:,}'.format(int(self.average_price)).replace(',', ' ')} rub",
-                end="\r",
-                flush=True,
-            )
-
-        time.sleep(15)
-        return True, 0, True
+        self.offers_state = extract_offers_state(html)
+        return offers
 
-    def _parse_block(self, block):
-        common_data = dict()
-        common_data["link"] = block.select("div[data-name='LinkArea']")[0].select("a")[0].get('href')
-        common_data["city"] = self.city_name
-        common_data["deal_type"] = self.deal_type
-        common_data["accommodation_type"] = self.accommodation_type
-
-        author_data = self._define_author(block)
-        location_data = self._define_location_data(block, self.is_sale())
-        price_data = self._define_price_data(block)
-        specification_data = self._define_specification_data(block)
-
-        if (self.is_by_homeowner and
-                (author_data["author_type"] != "unknown" and
-                 author_data["author_type"] != "homeowner")):
+    def _define_last_page(self, html: str, soup, count_of_offers_on_page: int) -> None:
+        self.count_of_offers = define_count_of_offers(html, soup)
+        if self.count_of_offers == -1 or count_of_offers_on_page == 0:
             return
 
-        if self.is_latin:
-            try:
-                location_data["district"] = transliterate.translit(location_data["district"], reversed=True)
-                location_data["street"] = transliterate.translit(location_data["street"], reversed=True)
-            except:
-                pass
-            try:
-                common_data["author"] = transliterate.translit(
-                    common_data["author"], reversed=True)
-            except:
-                pass
-            try:
-                common_data["city"] = transliterate.translit(
-                    common_data["city"], reversed=True)
-            except:
-                pass
-            try:
-                location_data["underground"] = transliterate.translit(
-                    location_data["underground"], reversed=True)
-            except:
-                pass
-            try:
-                location_data["residential_complex"] = transliterate.translit(
-                    location_data["residential_complex"], reversed=True)
-            except:
-                pass
-
-        page_data = dict()
-        if not self.is_express_mode:
-            res = self.session.get(url=common_data["link"])
-            res.raise_for_status()
-            html_offer_page = res.text
-
-            page_data = self._parse_page_offer(html_offer=html_offer_page)
-            if (
-                    page_data["year_of_construction"] == -1 and
-                    page_data["kitchen_meters"] == -1 and
-                    page_data["floors_count"] == -1
-            ):
-                page_data = self._parse_page_offer_json(html_offer=html_offer_page)
-
-        specification_data["price_per_m2"] = float(0)
-
-        if "price" in price_data:
-            price_type = "price"
-        elif "price_per_month" in price_data:
-            price_type = "price_per_month"
-
-        term_1 = self.average_price * self.parsed_announcements_count + price_data[price_type]
-        term_2 = self.parsed_announcements_count + 1
-        self.average_price = term_1 / term_2
-        price_data["price_per_m2"] = int(float(price_data[price_type]) / specification_data["total_meters"])
-        self.parsed_announcements_count += 1
-
-        if define_id_url(common_data["link"]) in self.result_parsed:
-            return
+        count_of_pages = min(math.ceil(self.count_of_offers / count_of_offers_on_page), MAX_COUNT_OF_PAGES)
+        self.last_page = max(min(self.last_page, count_of_pages), self.start_page)
+        print(f"Found {self.count_of_offers} announcements on {count_of_pages} pages, "
+              f"pages from {self.start_page} to {self.last_page} will be parsed")
+
+    def _print_progress(self, number_page: int, count_of_pages: int, ind: int, offers) -> None:
+        total_planed_announcements = len(offers) * count_of_pages
+        print(
+            f"\b" * 200 +
+            f"\r {number_page - self.start_page + 1} | {number_page} page with list: [" +
+            "=>" * (ind + 1) + "  " * (len(offers) - ind - 1) + "]" +
+            f" {math.ceil((ind + 1) * 100 / len(offers))}" + "%" +
+            f" | Count of all parsed: {self.parsed_announcements_count}."
+            f" Progress ratio: {math.ceil(self.parsed_announcements_count * 100 / total_planed_announcements)} %."
+            f" Average price: {'{:,}'.format(int(self.average_price)).replace(',', ' ')} rub",
+            end="\r",
+            flush=True,
+        )
 
-        self.result_parsed.add(define_id_url(common_data["link"]))
-        self.result.append(self._union(
-            author_data,
-            common_data,
-            specification_data,
-            price_data,
-            page_data,
-            location_data,
-        ))
-        if self.is_saving_csv:
-            self._save_results()
-
-    def _save_results(self):
-        self._correlate_fields_to_deal_type()
-        keys = self.result[0].keys()
-        with open(self.file_path, 'w', newline='') as output_file:
-            dict_writer = csv.DictWriter(output_file, keys, delimiter=';')
-            dict_writer.writeheader()
-            dict_writer.writerows(self.result)
-
-    def _correlate_fields_to_deal_type(self):
-        if self.is_sale():
-            for not_need_field in SPECIFIC_FIELDS_FOR_RENT_LONG:
-                if not_need_field in self.result[-1]:
-                    del self.result[-1][not_need_field]
-
-            for not_need_field in SPECIFIC_FIELDS_FOR_RENT_SHORT:
-                if not_need_field in self.result[-1]:
-                    del self.result[-1][not_need_field]
+    def _submit_pages_offer(self, offers):
+        """Start loading offer pages of all cards in the pool; results are consumed in the order of cards."""
+        if self.executor is None:
+            return None
+
+        return [
+            self.executor.submit(self._load_page_offer, link) if link is not None else None
+            for link in self._define_links_to_load(offers)
+        ]
+
+    def _define_links_to_load(self, offers) -> list:
+        """Links of offer pages needed for cards, None for cards which are skipped or parsed without loading."""
+        links = []
+        offer_ids_on_page = set()
+        for block in offers:
+            link = self._define_link(self._select_link_area(block))
+            offer_id = define_id_url(link)
+            if (self._is_parsed(offer_id) or self._is_seen(offer_id) or offer_id in offer_ids_on_page or
+                    self._is_skipped_by_author(self._define_author(block)[1])):
+                links.append(None)
+            else:
+                offer_ids_on_page.add(offer_id)
+                links.append(link)
+        return links
 
-        if self.is_rent_long():
-            for not_need_field in SPECIFIC_FIELDS_FOR_RENT_SHORT:
-                if not_need_field in self.result[-1]:
-                    del self.result[-1][not_need_field]
+    def _is_parsed(self, offer_id: str) -> bool:
+        return offer_id in self.result_parsed
 
-            for not_need_field in SPECIFIC_FIELDS_FOR_SALE:
-                if not_need_field in self.result[-1]:
-                    del self.result[-1][not_need_field]
+    def _is_seen(self, offer_id: str) -> bool:
+        """Whether offer was parsed in previous runs, then only its card data is refreshed."""
+        return self.seen_index is not None and offer_id in self.seen_index
 
-        if self.is_rent_short():
-            for not_need_field in SPECIFIC_FIELDS_FOR_RENT_LONG:
-                if not_need_field in self.result[-1]:
-                    del self.result[-1][not_need_field]
+    def _mark_parsed(self, offer_id: str) -> None:
+        self.result_parsed.add(offer_id)
+        if self.checkpoint is not None:
+            self.offer_ids_to_checkpoint.append(offer_id)
+        elif self.seen_index is not None:
+            self.seen_index.add(offer_id)
 
-            for not_need_field in SPECIFIC_FIELDS_FOR_SALE:
-                if not_need_field in self.result[-1]:
-                    del self.result[-1][not_need_field]
+    def _is_skipped_by_author(self, author_type: str) -> bool:
+        return self.is_by_homeowner and author_type != "unknown" and author_type != "homeowner"
 
-        return self.result
+    @staticmethod
+    def _select_link_area(block):
+        """Link area of card, it is selected once per card and shared by extractors of its rows."""
+        return block.select(LINK_AREA_SELECTOR)[0]
 
     @staticmethod
-    def _define_author(block):
-        spans = block.select("div")[0].select("span")
-        author_data = {
-            "author": "",
-            "author_type": "",
-        }
-        for index, span in enumerate(spans):
-            if "Агентство недвижимости" in span:
-                author_data["author"] = spans[index + 1].text.replace(",", ".").strip()
-                author_data["author_type"] = "real_estate_agent"
-                return author_data
+    def _define_link(link_area) -> str:
+        return link_area.select_one("a").get('href')
 
-        for index, span in enumerate(spans):
-            if "Собственник" in span:
-                author_data["author"] = spans[index + 1].text
-                author_data["author_type"] = "homeowner"
-                return author_data
+    def _load_page_offer(self, link: str) -> dict:
+        """Data of offer page, the page is requested again up to 3 times if it is a captcha or fails."""
+        for attempt_number in range(1, 4):
+            try:
+                return self._define_page_data(self._get(link, is_page_offer=True), define_id_url(link))
+            except Exception as exc:
+                if attempt_number == 3:
+                    raise
+                self._report_offer_retry(exc, attempt_number)
+
+    def _report_offer_retry(self, exc: Exception, attempt_number: int) -> None:
+        self.stats.increment("retries")
+        print(f"\n\nException: {exc}")
+        self.rate_limiter.report_throttling()
+        print(f'Retrying offer page. Attempt number {attempt_number}')
+
+    def _define_page_data(self, html_offer_page: str, offer_id: str = None) -> dict:
+        """Data of offer page, raises Exception('Captcha') if cian answered with captcha instead of the page."""
+        with self.stats.measure("offer_parse"):
+            return self._parse_page_data(html_offer_page, offer_id)
+
+    def _parse_page_data(self, html_offer_page: str, offer_id: str = None) -> dict:
+        offers_state = extract_offers_state(html_offer_page)
+        if offer_id in offers_state:
+            return define_page_data(offers_state[offer_id])
+
+        soup_offer_page = make_document(html_offer_page, self.parser_backend)
+        if 'Captcha' in soup_offer_page.text:
+            self.stats.increment("captchas")
+            raise Exception('Captcha')
 
-        for index, span in enumerate(spans):
-            if "Риелтор" in span:
-                author_data["author"] = spans[index + 1].text
-                author_data["author_type"] = "realtor"
-                return author_data
+        page_data = self._parse_page_offer(html_offer=html_offer_page, soup_offer_page=soup_offer_page)
+        if (
+                page_data["year_of_construction"] == -1 and
+                page_data["kitchen_meters"] == -1 and
+                page_data["floors_count"] == -1
+        ):
+            page_data = self._parse_page_offer_json(html_offer=html_offer_page, soup_offer_page=soup_offer_page)
+        return page_data
 
-        for index, span in enumerate(spans):
-            if "Ук・оф.Представитель" in span:
-                author_data["author"] = spans[index + 1].text
-                author_data["author_type"] = "official_representative"
-                return author_data
+    def _parse_block(self, block, page_data=None):
+        link_area = self._select_link_area(block)
+        link = self._define_link(link_area)
+        offer_id = define_id_url(link)
+        if self._is_parsed(offer_id):
+            return
 
-        for index, span in enumerate(spans):
-            if "Представитель застройщика" in span:
-                author_data["author"] = spans[index + 1].text
-                author_data["author_type"] = "representative_developer"
-                return author_data
+        offer = self.offer_class()
+        offer.link = link
+        offer.city = self.city_name
+        offer.deal_type = self.deal_type
+        offer.accommodation_type = self.accommodation_type
+
+        offer_fields = self.offers_state.get(offer_id)
+        if offer_fields is not None and offer_fields["price"] == -1:
+            offer_fields = None
+
+        with self.stats.measure("card_extraction"):
+            rows = link_area.select(CARD_ROW_SELECTOR)
+            offer.author, offer.author_type = self._define_author(block)
+            offer.address = self._define_address(rows, self.is_sale())
+            if offer_fields is not None:
+                price, commissions = offer_fields["price"], offer_fields["commissions"]
+                page_data_of_card = define_page_data(offer_fields)
+                if any(field not in page_data_of_card for field in SPECIFICATION_FIELDS):
+                    offer.floor, offer.floors_count, offer.rooms_count, offer.total_meters = (
+                        self._define_specification_data(rows)
+                    )
+                offer.update(page_data_of_card)
+            else:
+                price, commissions = self._define_price_data(rows)
+                offer.floor, offer.floors_count, offer.rooms_count, offer.total_meters = (
+                    self._define_specification_data(rows)
+                )
 
-        for index, span in enumerate(spans):
-            if "Застройщик" in span:
-                author_data["author"] = spans[index + 1].text
-                author_data["author_type"] = "developer"
-                return author_data
+        if self._is_skipped_by_author(offer.author_type):
+            return
+
+        if self.is_latin and self.is_latin != "sink":
+            with self.stats.measure("transliteration"):
+                for field in LATIN_FIELDS:
+                    value = offer.get(field)
+                    if value:
+                        setattr(offer, field, transliterate_to_latin(value))
+
+        if page_data is not None:
+            offer.update(page_data)
+        elif not self.is_express_mode and not self._is_seen(offer_id):
+            offer.update(self._load_page_offer(link))
+
+        offer.set_price(price, commissions)
+        term_1 = self.average_price * self.parsed_announcements_count + price
+        term_2 = self.parsed_announcements_count + 1
+        self.average_price = term_1 / term_2
+        offer.price_per_m2 = int(float(price) / offer.total_meters) if offer.total_meters > 0 else -1
+        self.parsed_announcements_count += 1
+
+        self._mark_parsed(offer_id)
+        if self.is_saving_csv:
+            self._save_results(offer)
+        return offer
+
+    def _save_results(self, record):
+        with self.stats.measure("sink_write"):
+            self.sink.write(record)
 
+    def _define_fieldnames(self) -> list:
+        return list(self.offer_class.FIELDS)
+
+    @staticmethod
+    def _define_author(block) -> tuple:
+        """Author by the label of AUTHOR_TYPES with the highest priority, spans of card are scanned once."""
+        spans = block.select_one("div").select("span")
+        rank, label_index, id_index = len(AUTHOR_TYPES), None, None
         for index, span in enumerate(spans):
-            if "ID" in span.text:
-                author_data["author"] = span.text
-                author_data["author_type"] = "unknown"
-                return author_data
+            for content in span.contents:
+                if isinstance(content, str) and AUTHOR_TYPE_RANKS.get(content, rank) < rank:
+                    rank, label_index = AUTHOR_TYPE_RANKS[content], index
+            if rank == 0:
+                break
+            if label_index is None and id_index is None and "ID" in span.text:
+                id_index = index
+
+        if label_index is not None:
+            author_type = AUTHOR_TYPES[rank][1]
+            if author_type == "real_estate_agent":
+                return spans[label_index + 1].text.replace(",", ".").strip(), author_type
+            return spans[label_index + 1].text, author_type
+
+        if id_index is not None:
+            return spans[id_index].text, "unknown"
 
-        return author_data
+        return "", ""
 
     @staticmethod
-    def _define_location_data(block, is_sale: bool):
-        elements = (
-            block.select_one("div[data-name='LinkArea']")
-            .select("div[data-name='GeneralInfoSectionRowComponent']")
-        )
-        location_data = dict()
-        location_data['address'] = ''
-        for element in elements:
-            if 'Москва' in element.text and location_data['address'] == '':
-                location_data['address'] = ', '.join(element.text.split(',')[-2:])
-        return location_data
+    def _define_address(rows, is_sale: bool) -> str:
+        for row in rows:
+            if 'Москва' in row.text:
+                return ', '.join(row.text.split(',')[-2:])
+        return ''
 
     @staticmethod
-    def _define_price_data(block):
-        elements = (
-            block.select("div[data-name='LinkArea']")[0]
-            .select("div[data-name='GeneralInfoSectionRowComponent']")
-        )
-        price_data = {
-            "price_per_month": -1,
-            "commissions": 0,
-        }
-        for element in elements:
-            if "₽/мес" in element.text:
-                price_description = element.text
-                price_data["price_per_month"] = int(
-                    "".join(price_description[:price_description.find("₽/мес") - 1].split())
-                )
+    def _define_price_data(rows) -> tuple:
+        """Price and commissions in percents of the card, -1 and 0 if they are not found."""
+        for row in rows:
+            price_description = row.text
+            if "₽/мес" in price_description:
+                price = int("".join(price_description[:price_description.find("₽/мес") - 1].split()))
+                commissions = 0
                 if "%" in price_description:
-                    price_data["commissions"] = int(
+                    commissions = int(
                         price_description[price_description.find("%") - 2:price_description.find("%")].replace(" ", "")
                     )
-                return price_data
+                return price, commissions
 
-            if "₽" in element.text:
-                price_description = element.text
-                price_data["price"] = int("".join(price_description[:price_description.find("₽") - 1].split()))
-                return price_data
+            if "₽" in price_description:
+                return int("".join(price_description[:price_description.find("₽") - 1].split())), 0
 
-        return price_data
+        return -1, 0
 
     @staticmethod
-    def _define_specification_data(block):
-        title = (
-            block.select("div[data-name='LinkArea']")[0]
-            .select("div[data-name='GeneralInfoSectionRowComponent']")[0].text
-        )
-        common_properties = (
-            block.select("div[data-name='LinkArea']")[0]
-            .select("div[data-name='GeneralInfoSectionRowComponent']")[0].text
-        )
-        total_meters = None
-        if common_properties.find("м²") is not None:
-            total_meters = title[: common_properties.find("м²")].replace(",", ".")
-            if len(re.findall(FLOATS_NUMBERS_REG_EXPRESSION, total_meters)) != 0:
-                total_meters = float(
-                    re.findall(FLOATS_NUMBERS_REG_EXPRESSION, total_meters)[-1]
-                    .replace(" ", "").replace("-", "")
-                )
-            else:
-                total_meters = -1
+    def _define_specification_data(rows) -> tuple:
+        common_properties = rows[0].text
+        total_meters = common_properties[: common_properties.find("м²")].replace(",", ".")
+        floats = FLOATS_NUMBERS_PATTERN.findall(total_meters)
+        if len(floats) != 0:
+            total_meters = float(floats[-1].replace(" ", "").replace("-", ""))
+        else:
+            total_meters = -1
 
         if "этаж" in common_properties:
             floor_per = common_properties[common_properties.rfind("этаж") - 7: common_properties.rfind("этаж")]
@@ -427,13 +667,13 @@ class ParserOffers(ABC):
             else:
                 floor, floors_count = floor_per[0], floor_per[1]
 
-            ints = re.findall(r'\d+', floor)
+            ints = INTEGERS_PATTERN.findall(floor)
             if len(ints) == 0:
                 floor = -1
             else:
                 floor = int(ints[-1])
 
-            ints = re.findall(r'\d+', floors_count)
+            ints = INTEGERS_PATTERN.findall(floors_count)
             if len(ints) == 0:
                 floors_count = -1
             else:
@@ -442,19 +682,12 @@ class ParserOffers(ABC):
             floors_count = -1
             floor = -1
 
-        return {
-            "floor": floor,
-            "floors_count": floors_count,
-            "rooms_count": define_rooms_count(common_properties),
-            "total_meters": total_meters,
-        }
+        return floor, floors_count, define_rooms_count(common_properties), total_meters
 
-    @staticmethod
-    def _parse_page_offer(html_offer):
-        try:
-            soup_offer_page = BeautifulSoup(html_offer, 'lxml')
-        except:
-            soup_offer_page = BeautifulSoup(html_offer, 'html.parser')
+    @classmethod
+    def _parse_page_offer(cls, html_offer, soup_offer_page=None):
+        if soup_offer_page is None:
+            soup_offer_page = make_document(html_offer)
 
         page_data = {
             "year_of_construction": -1,
@@ -469,23 +702,24 @@ class ParserOffers(ABC):
         if len(offer_page) == 0:
             return page_data
 
+        text_summary = offer_page[0].text
         try:
-            text_offer = offer_page[0].text
+            text_offer = text_summary
             if "Кухня" in text_offer:
                 kitchen = (text_offer[:text_offer.find("Кухня")])
                 page_data["kitchen_meters"] = float(
-                    re.findall(FLOATS_NUMBERS_REG_EXPRESSION, kitchen.replace(",", "."))[-1])
+                    FLOATS_NUMBERS_PATTERN.findall(kitchen.replace(",", "."))[-1])
             else:
                 page_data["kitchen_meters"] = -1
         except:
             page_data["kitchen_meters"] = -1
 
         try:
-            text_offer = offer_page[0].text
+            text_offer = text_summary
             if "Жилая" in text_offer:
                 lining = (text_offer[:text_offer.find("Жилая")])
                 page_data["living_meters"] = float(
-                    re.findall(FLOATS_NUMBERS_REG_EXPRESSION, lining.replace(",", "."))[-1])
+                    FLOATS_NUMBERS_PATTERN.findall(lining.replace(",", "."))[-1])
             else:
                 page_data["living_meters"] = -1
         except:
@@ -501,11 +735,11 @@ class ParserOffers(ABC):
             pass
 
         try:
-            text_offer = offer_page[0].text
+            text_offer = text_summary
             if "Этаж" in text_offer and "из" in text_offer:
                 floor_data = (text_offer[:text_offer.find("Этаж")].split("Этаж")[-1])
-                page_data["floors_count"] = int(re.findall(r'\d+', floor_data.replace(",", "."))[-1])
-                page_data["floor"] = int(re.findall(r'\d+', floor_data.replace(",", "."))[-2])
+                page_data["floors_count"] = int(INTEGERS_PATTERN.findall(floor_data.replace(",", "."))[-1])
+                page_data["floor"] = int(INTEGERS_PATTERN.findall(floor_data.replace(",", "."))[-2])
             else:
                 page_data["floors_count"] = -1
                 page_data["floor"] = -1
@@ -523,7 +757,7 @@ class ParserOffers(ABC):
         if len(build_data) != 0:
             build_data = build_data[0].text
             year_str = build_data[build_data.find("Год постройки") + 13: build_data.find("Год постройки") + 17]
-            ints = re.findall(r'\d+', year_str)
+            ints = INTEGERS_PATTERN.findall(year_str)
             if len(ints) != 0:
                 page_data["year_of_construction"] = int(ints[0])
                 return page_data
@@ -532,7 +766,7 @@ class ParserOffers(ABC):
         try:
             text_offer = offer_page[0].text
             if "сдача в" in text_offer:
-                ints = re.findall(r'\d+', text_offer.split("сдача в")[1])
+                ints = INTEGERS_PATTERN.findall(text_offer.split("сдача в")[1])
                 if len(ints) != 0:
                     for number in ints:
                         if int(number) > 1000:
@@ -544,7 +778,7 @@ class ParserOffers(ABC):
         try:
             text_offer = offer_page[0].text
             if "сдан в" in text_offer:
-                ints = re.findall(r'\d+', text_offer.split("сдан в")[1])
+                ints = INTEGERS_PATTERN.findall(text_offer.split("сдан в")[1])
                 if len(ints) != 0:
                     for number in ints:
                         if int(number) > 1000:
@@ -555,9 +789,11 @@ class ParserOffers(ABC):
 
         return page_data
 
-    @staticmethod
-    def _parse_page_offer_json(html_offer):
-        soup_offer_page = BeautifulSoup(html_offer, 'lxml')
+    @classmethod
+    def _parse_page_offer_json(cls, html_offer, soup_offer_page=None):
+        if soup_offer_page is None:
+            soup_offer_page = make_document(html_offer)
+
         page_data = {
             "year_of_construction": -1,
             "living_meters": -1,
@@ -567,50 +803,30 @@ class ParserOffers(ABC):
             "phone": "",
         }
         spans = soup_offer_page.select("span")
-        for index, span in enumerate(spans):
-            if "Год постройки" in span:
-                page_data["year_of_construction"] = spans[index + 1].text
-
-        if page_data["year_of_construction"] == -1:
-            p_tags = soup_offer_page.select("p")
+        values = cls._define_labeled_values(spans, OFFER_PAGE_LABELS)
 
-            for index, p_tag in enumerate(p_tags):
-                if "Год постройки" in p_tag:
-                    page_data["year_of_construction"] = p_tags[index + 1].text
-
-        if page_data["year_of_construction"] == -1:
-            for index, span in enumerate(spans):
-                if "Год сдачи" in span:
-                    page_data["year_of_construction"] = spans[index + 1].text
-
-        for index, span in enumerate(spans):
-            if "Площадь кухни" in span:
-                page_data["kitchen_meters"] = spans[index + 1].text
-                floats = re.findall(FLOATS_NUMBERS_REG_EXPRESSION, page_data["kitchen_meters"])
-                if len(floats) == 0:
-                    page_data["kitchen_meters"] = -1
-                else:
-                    page_data["kitchen_meters"] = float(floats[0])
-
-        for index, span in enumerate(spans):
-            if "Жилая площадь" in span:
-                page_data["living_meters"] = spans[index + 1].text
-                floats = re.findall(FLOATS_NUMBERS_REG_EXPRESSION, page_data["living_meters"])
-                if len(floats) == 0:
-                    page_data["living_meters"] = -1
-                else:
-                    page_data["living_meters"] = float(floats[0])
-
-        for index, span in enumerate(spans):
-            if "Этаж" in span:
-                text_value = spans[index + 1].text
-                ints = re.findall(r'\d+', text_value)
-                if len(ints) != 2:
-                    page_data["floor"] = -1
-                    page_data["floors_count"] = -1
-                else:
-                    page_data["floor"] = int(ints[0])
-                    page_data["floors_count"] = int(ints[1])
+        if "Год постройки" in values:
+            page_data["year_of_construction"] = values["Год постройки"]
+        else:
+            p_values = cls._define_labeled_values(soup_offer_page.select("p"), {"Год постройки"})
+            if "Год постройки" in p_values:
+                page_data["year_of_construction"] = p_values["Год постройки"]
+            elif "Год сдачи" in values:
+                page_data["year_of_construction"] = values["Год сдачи"]
+
+        if "Площадь кухни" in values:
+            floats = FLOATS_NUMBERS_PATTERN.findall(values["Площадь кухни"])
+            page_data["kitchen_meters"] = -1 if len(floats) == 0 else float(floats[0])
+
+        if "Жилая площадь" in values:
+            floats = FLOATS_NUMBERS_PATTERN.findall(values["Жилая площадь"])
+            page_data["living_meters"] = -1 if len(floats) == 0 else float(floats[0])
+
+        if "Этаж" in values:
+            ints = INTEGERS_PATTERN.findall(values["Этаж"])
+            if len(ints) == 2:
+                page_data["floor"] = int(ints[0])
+                page_data["floors_count"] = int(ints[1])
 
         if "+7" in html_offer:
             page_data["phone"] = html_offer[html_offer.find("+7"): html_offer.find("+7") + 16].split('"')[0].\
@@ -620,15 +836,24 @@ class ParserOffers(ABC):
         return page_data
 
     @staticmethod
-    def _union(*dicts):
-        return dict(itertools.chain.from_iterable(dct.items() for dct in dicts))
+    def _define_labeled_values(tags, labels) -> dict:
+        """Walk tags once and take the text of the tag following each label (the last one if a label repeats)."""
+        values = dict()
+        for index, tag in enumerate(tags):
+            for child in tag.contents:
+                if isinstance(child, str) and child in labels:
+                    values[str(child)] = tags[index + 1].text
+        return values
 
 
 class ParserOffersAuto(ParserOffers):
     def __init__(self, deal_type: str, accommodation_type: str, city_name: str, location_id: str, rooms,
                  start_page: int, end_page: int, is_saving_csv=False, is_latin=False,
                  is_express_mode=False, is_by_homeowner=False,
-                 data_dir_path=None):
+                 data_dir_path=None, csv_flush_every=1,
+                 max_workers=1, rate_limiter=None, seen_index=None,
+                 response_cache=None, parser_backend="bs4", stats=None, output_format="csv", resume=None,
+                 session_pool=None):
 
         super().__init__(
             deal_type,
@@ -641,9 +866,20 @@ class ParserOffersAuto(ParserOffers):
             is_express_mode,
             is_by_homeowner,
             data_dir_path,
+            csv_flush_every,
+            max_workers,
+            rate_limiter,
+            seen_index,
+            response_cache,
+            parser_backend,
+            stats,
+            output_format,
+            resume,
+            session_pool,
         )
         self.location_id = location_id
         self.rooms = rooms
+        self.shard = None
 
     def _build_url(self, number_page: int) -> str:
         rooms_path = ""
@@ -675,6 +911,8 @@ class ParserOffersAuto(ParserOffers):
             url += IS_ONLY_HOMEOWNER
 
         url = url.format(number_page, self.location_id)
+        if self.shard is not None:
+            url += self.shard.url_parameters()
         return url
 
 
@@ -682,7 +920,10 @@ class ParserOffersByURL(ParserOffers):
     def __init__(self, search_url: str, deal_type: str, accommodation_type: str, city_name: str,
                  start_page: int, end_page: int, is_saving_csv=False, is_latin=False,
                  is_express_mode=False, is_by_homeowner=False,
-                 data_dir_path=None):
+                 data_dir_path=None, csv_flush_every=1,
+                 max_workers=1, rate_limiter=None, seen_index=None,
+                 response_cache=None, parser_backend="bs4", stats=None, output_format="csv", resume=None,
+                 session_pool=None):
 
         super().__init__(
             deal_type,
@@ -695,6 +936,16 @@ class ParserOffersByURL(ParserOffers):
             is_express_mode,
             is_by_homeowner,
             data_dir_path,
+            csv_flush_every,
+            max_workers,
+            rate_limiter,
+            seen_index,
+            response_cache,
+            parser_backend,
+            stats,
+            output_format,
+            resume,
+            session_pool,
         )
         self.search_url = search_url
 
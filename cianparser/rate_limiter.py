@@ -0,0 +1,109 @@
+import random
+import threading
+import time
+
+
+class RateLimiter:
+    """Adaptive token bucket for requests to cian, it may be shared by several parsers, threads and coroutines.
+
+    The bucket holds up to burst tokens and is refilled with requests_per_second tokens per second.
+    After every successful response the rate grows by speedup (up to max_requests_per_second),
+    when cian starts throttling (captcha, 429, empty page) the rate is divided by slowdown
+    (down to min_requests_per_second) and the bucket is emptied.
+    A random pause up to jitter seconds is added to every request.
+    """
+
+    def __init__(self, requests_per_second: float = 0.5, burst: int = 1, jitter: float = 0.5,
+                 max_requests_per_second: float = None, min_requests_per_second: float = None,
+                 speedup: float = 1.02, slowdown: float = 2):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.jitter = jitter
+        self.max_requests_per_second = max_requests_per_second or (requests_per_second or 0) * 4
+        self.min_requests_per_second = min_requests_per_second or (requests_per_second or 0) / 8
+        self.speedup = speedup
+        self.slowdown = slowdown
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._last_refill_time = time.monotonic()
+
+    def acquire(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        import asyncio
+
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def report_success(self) -> None:
+        with self._lock:
+            if self.requests_per_second:
+                self.requests_per_second = min(self.requests_per_second * self.speedup, self.max_requests_per_second)
+
+    def report_throttling(self) -> None:
+        with self._lock:
+            if self.requests_per_second:
+                self._refill()
+                self.requests_per_second = max(self.requests_per_second / self.slowdown, self.min_requests_per_second)
+                self._tokens = min(self._tokens, 0.0)
+
+    def _reserve(self) -> float:
+        if not self.requests_per_second:
+            return 0
+
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            delay = -self._tokens / self.requests_per_second if self._tokens < 0 else 0
+
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        return delay
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._last_refill_time) * self.requests_per_second, self.burst)
+        self._last_refill_time = now
+
+
+class SharedRateLimiter(RateLimiter):
+    """RateLimiter whose budget is shared by several processes, e.g. workers of cianparser.parse_many.
+
+    It must reach other processes at their start (as an argument of Process or of a pool initializer).
+    """
+
+    def __init__(self, *args, **kwargs):
+        import multiprocessing
+
+        self._shared_state = multiprocessing.get_context().Array('d', 3)
+        super().__init__(*args, **kwargs)
+        self._lock = self._shared_state.get_lock()
+
+    @property
+    def requests_per_second(self) -> float:
+        return self._shared_state[0]
+
+    @requests_per_second.setter
+    def requests_per_second(self, value) -> None:
+        self._shared_state[0] = value or 0
+
+    @property
+    def _tokens(self) -> float:
+        return self._shared_state[1]
+
+    @_tokens.setter
+    def _tokens(self, value) -> None:
+        self._shared_state[1] = value
+
+    @property
+    def _last_refill_time(self) -> float:
+        return self._shared_state[2]
+
+    @_last_refill_time.setter
+    def _last_refill_time(self, value) -> None:
+        self._shared_state[2] = value
@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+import time
+import urllib.parse
+import zlib
+
+from cianparser.backends import make_document
+from cianparser.constants import LISTING_PAGE_MARKERS, OFFER_PAGE_MARKERS
+
+
+class ResponseCache:
+    """Html responses of cian stored compressed in sqlite, with separate ttl for listing and offer pages.
+
+    Least recently used responses are evicted when the total size of compressed bodies exceeds max_bytes.
+    Pages with captcha and pages without cards or offer content are not stored, they are counted in rejections.
+    Counters hits, misses, evictions and rejections show how useful the cache is.
+    """
+
+    def __init__(self, path, listing_ttl: float = 15 * 60, offer_ttl: float = 24 * 60 * 60,
+                 max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.listing_ttl = listing_ttl
+        self.offer_ttl = offer_ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, is_page_offer INTEGER, body BLOB, size INTEGER, created REAL, accessed REAL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._connection.commit()
+        self.total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        parts = urllib.parse.urlsplit(url.strip())
+        host = parts.netloc.lower()
+        if host.startswith("www."):
+            host = host[4:]
+        query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+        path = parts.path.rstrip("/") or "/"
+        return urllib.parse.urlunsplit((parts.scheme.lower() or "https", host, path, query, ""))
+
+    def get(self, url: str, is_page_offer: bool = False):
+        key = self.normalize_url(url)
+        ttl = self.offer_ttl if is_page_offer else self.listing_ttl
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT body, created FROM responses WHERE url = ?", (key,)).fetchone()
+            if row is None or now - row[1] > ttl:
+                self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE responses SET accessed = ? WHERE url = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    @staticmethod
+    def is_complete(html: str, is_page_offer: bool = False) -> bool:
+        """Whether the page is worth storing: cian answers captcha and throttling pages with status 200 too.
+
+        'Captcha' in scripts and json of usual pages is not a captcha, so only the text of page is checked for it.
+        """
+        markers = OFFER_PAGE_MARKERS if is_page_offer else LISTING_PAGE_MARKERS
+        if not any(marker in html for marker in markers):
+            return False
+        return 'Captcha' not in html or 'Captcha' not in make_document(html).text
+
+    def put(self, url: str, html: str, is_page_offer: bool = False) -> None:
+        if not self.is_complete(html, is_page_offer):
+            with self._lock:
+                self.rejections += 1
+            return
+
+        key = self.normalize_url(url)
+        body = zlib.compress(html.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._delete(key)
+            self._connection.execute(
+                "INSERT INTO responses (url, is_page_offer, body, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, int(is_page_offer), body, len(body), now, now),
+            )
+            self.total_bytes += len(body)
+            self._evict()
+            self._connection.commit()
+
+    def delete(self, url: str) -> None:
+        with self._lock:
+            self._delete(self.normalize_url(url))
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _delete(self, key: str) -> None:
+        row = self._connection.execute("SELECT size FROM responses WHERE url = ?", (key,)).fetchone()
+        if row is not None:
+            self._connection.execute("DELETE FROM responses WHERE url = ?", (key,))
+            self.total_bytes -= row[0]
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes:
+            row = self._connection.execute("SELECT url, size FROM responses ORDER BY accessed LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._connection.execute("DELETE FROM responses WHERE url = ?", (row[0],))
+            self.total_bytes -= row[1]
+            self.evictions += 1
@@ -0,0 +1,52 @@
+import sqlite3
+import threading
+
+
+class SeenIndex:
+    """Ids of already parsed offers stored in sqlite, so that next runs take only their card data without loading offer pages.
+
+    It may be shared by parsers running in several threads.
+    """
+
+    def __init__(self, path, commit_every: int = 100):
+        self.path = path
+        self.commit_every = commit_every
+        self._count_uncommitted = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS seen_offers (offer_id TEXT PRIMARY KEY) WITHOUT ROWID")
+        self._connection.commit()
+
+    def __contains__(self, offer_id: str) -> bool:
+        with self._lock:
+            cursor = self._connection.execute("SELECT 1 FROM seen_offers WHERE offer_id = ?", (offer_id,))
+            return cursor.fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM seen_offers").fetchone()[0]
+
+    def add(self, offer_id: str) -> None:
+        with self._lock:
+            self._connection.execute("INSERT OR IGNORE INTO seen_offers (offer_id) VALUES (?)", (offer_id,))
+            self._count_uncommitted += 1
+            if self._count_uncommitted >= self.commit_every:
+                self._commit()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._commit()
+
+    def close(self) -> None:
+        self.flush()
+        self._connection.close()
+
+    def _commit(self) -> None:
+        self._connection.commit()
+        self._count_uncommitted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
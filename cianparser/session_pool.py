@@ -0,0 +1,136 @@
+import itertools
+import threading
+
+from cianparser.constants import HEADERS, WARM_UP_URL
+from cianparser.rate_limiter import RateLimiter
+
+
+class PooledSession:
+    """Cloudscraper session of SessionPool with its own proxy and RateLimiter."""
+
+    __slots__ = ("session", "proxy", "rate_limiter", "count_of_requests", "count_of_captchas", "is_retired")
+
+    def __init__(self, session, proxy, rate_limiter):
+        self.session = session
+        self.proxy = proxy
+        self.rate_limiter = rate_limiter
+        self.count_of_requests = 0
+        self.count_of_captchas = 0
+        self.is_retired = False
+
+
+class SessionPool:
+    """Several warmed cloudscraper sessions, requests are distributed over them in turn.
+
+    Every session keeps its own keep-alive connections and cookies, goes through its own proxy (if proxies
+    are given) and is paced by its own RateLimiter, so the requests budget grows with the size of the pool.
+    A session is retired after max_captchas captchas in a row, the request is repeated by the next session.
+    It may be passed to several parsers and threads, it is used instead of the session of parser.
+    """
+
+    def __init__(self, size: int = None, proxies=None, requests_per_second: float = 0.5, burst: int = 1,
+                 jitter: float = 0.5, max_captchas: int = 2, pool_maxsize: int = 10, is_warming_up=True):
+        self.proxies = list(proxies or [])
+        self.size = size or len(self.proxies) or 4
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.jitter = jitter
+        self.max_captchas = max_captchas
+        self.pool_maxsize = pool_maxsize
+        self.is_warming_up = is_warming_up
+
+        self._lock = threading.RLock()
+        self._sessions = None
+        self._turns = None
+
+    @property
+    def sessions(self) -> list:
+        """Sessions are created and warmed up on the first request, so cloudscraper is imported only then."""
+        with self._lock:
+            if self._sessions is None:
+                self._sessions = [self._create_session(ind) for ind in range(self.size)]
+                self._turns = itertools.cycle(self._sessions)
+        return self._sessions
+
+    def __len__(self) -> int:
+        """Count of sessions which are not retired."""
+        return sum(1 for pooled_session in self.sessions if not pooled_session.is_retired)
+
+    def get(self, url: str, stats=None, **kwargs):
+        """Response of the next session in turn, raises Exception('Captcha') if every session gets captcha.
+
+        :param stats: CrawlStats of the parser, every request of sessions, its bytes, captchas and retries
+            of the request by the next session are counted there
+        """
+        for attempt_number in range(len(self.sessions)):
+            if attempt_number > 0 and stats is not None:
+                stats.increment("retries")
+            pooled_session = self._next_session()
+            response = self._request(pooled_session, url, stats, **kwargs)
+            if response is not None:
+                return response
+        raise Exception('Captcha')
+
+    def _create_session(self, ind: int) -> PooledSession:
+        import cloudscraper
+
+        from requests.adapters import HTTPAdapter
+
+        session = cloudscraper.create_scraper()
+        session.headers = dict(HEADERS)
+        session.mount("https://", cloudscraper.CipherSuiteAdapter(
+            cipherSuite=session.cipherSuite, ecdhCurve=session.ecdhCurve, server_hostname=session.server_hostname,
+            source_address=session.source_address, ssl_context=session.ssl_context,
+            pool_connections=self.pool_maxsize, pool_maxsize=self.pool_maxsize,
+        ))
+        session.mount("http://", HTTPAdapter(pool_connections=self.pool_maxsize, pool_maxsize=self.pool_maxsize))
+
+        proxy = self.proxies[ind % len(self.proxies)] if self.proxies else None
+        if proxy is not None:
+            session.proxies = {"http": proxy, "https": proxy}
+
+        rate_limiter = RateLimiter(requests_per_second=self.requests_per_second, burst=self.burst, jitter=self.jitter)
+        pooled_session = PooledSession(session, proxy, rate_limiter)
+        if self.is_warming_up:
+            try:
+                self._request(pooled_session, WARM_UP_URL)
+            except Exception as exc:
+                pooled_session.is_retired = True
+                print(f"\nSession {proxy or ''} is retired, it can not reach cian: {exc}")
+        return pooled_session
+
+    def _next_session(self) -> PooledSession:
+        sessions = self.sessions
+        with self._lock:
+            for _ in range(len(sessions)):
+                pooled_session = next(self._turns)
+                if not pooled_session.is_retired:
+                    return pooled_session
+        raise Exception('All sessions of pool are retired because of captcha')
+
+    def _request(self, pooled_session: PooledSession, url: str, stats=None, **kwargs):
+        """Response of session, None if it got captcha."""
+        pooled_session.rate_limiter.acquire()
+        response = pooled_session.session.get(url, **kwargs)
+        is_captcha = response.status_code == 429 or 'Captcha' in response.text
+        if stats is not None:
+            stats.increment("requests")
+            stats.increment("bytes", len(response.content))
+            if is_captcha:
+                stats.increment("captchas")
+        with self._lock:
+            pooled_session.count_of_requests += 1
+            if is_captcha:
+                pooled_session.count_of_captchas += 1
+                if not pooled_session.is_retired and pooled_session.count_of_captchas >= self.max_captchas:
+                    pooled_session.is_retired = True
+                    print(f"\nSession {pooled_session.proxy or ''} is retired after "
+                          f"{pooled_session.count_of_captchas} captchas")
+            else:
+                pooled_session.count_of_captchas = 0
+
+        if is_captcha:
+            pooled_session.rate_limiter.report_throttling()
+            return None
+        pooled_session.rate_limiter.report_success()
+        return response
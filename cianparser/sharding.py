@@ -0,0 +1,198 @@
+import math
+import queue
+import threading
+
+from cianparser.backends import make_document
+from cianparser.constants import (
+    COUNT_OF_OFFERS_PER_PAGE, MAX_COUNT_OF_PAGES, MAX_PRICE, MAX_PRICE_OF_SHARD, MAX_TOTAL_AREA,
+    MAX_TOTAL_AREA_OF_SHARD, MIN_PRICE, MIN_TOTAL_AREA,
+)
+from cianparser.helpers import define_count_of_offers, define_id_url
+
+SHARD_CAPACITY = MAX_COUNT_OF_PAGES * COUNT_OF_OFFERS_PER_PAGE
+
+
+class Shard:
+    """Band of prices and of total area of a query, bounds are inclusive and None is unbounded."""
+
+    __slots__ = ("min_price", "max_price", "min_area", "max_area", "count_of_offers")
+
+    def __init__(self, min_price=None, max_price=None, min_area=None, max_area=None):
+        self.min_price = min_price
+        self.max_price = max_price
+        self.min_area = min_area
+        self.max_area = max_area
+        self.count_of_offers = -1
+
+    def url_parameters(self) -> str:
+        parameters = ""
+        for template, value in ((MIN_PRICE, self.min_price), (MAX_PRICE, self.max_price),
+                                (MIN_TOTAL_AREA, self.min_area), (MAX_TOTAL_AREA, self.max_area)):
+            if value is not None:
+                parameters += template.format(value)
+        return parameters
+
+    def split(self):
+        """Two halves of the band by price, by total area when it is a single price, None if neither can be split.
+
+    Halves by total area share their bound, see _split_band.
+    """
+        prices = _split_band(self.min_price, self.max_price, MAX_PRICE_OF_SHARD)
+        if prices is not None:
+            return tuple(Shard(*price_band, self.min_area, self.max_area) for price_band in prices)
+
+        areas = _split_band(self.min_area, self.max_area, MAX_TOTAL_AREA_OF_SHARD, is_overlapping=True)
+        if areas is not None:
+            return tuple(Shard(self.min_price, self.max_price, *area_band) for area_band in areas)
+
+        return None
+
+    def __repr__(self) -> str:
+        return (f"Shard(price={self.min_price}..{self.max_price}, total_area={self.min_area}..{self.max_area}, "
+                f"count_of_offers={self.count_of_offers})")
+
+
+def plan_shards(parser, max_count_of_offers: int = SHARD_CAPACITY) -> list:
+    """Split the query of ParserOffersAuto into shards, which have no more offers than cian shows on its pages.
+
+    Every band is counted by its first page and split in halves while it is too large: by price
+    in the geometric middle, then by total area. Empty bands are dropped. Raises Exception if the first page
+    of a band does not report the count of its offers, since then the query can not be split.
+    """
+    shards = []
+    bands = [Shard()]
+    while bands:
+        shard = bands.pop()
+        shard.count_of_offers = _count_offers(parser, shard)
+        if shard.count_of_offers == 0:
+            continue
+
+        halves = shard.split() if shard.count_of_offers > max_count_of_offers else None
+        if halves is not None:
+            bands.extend(reversed(halves))
+            continue
+
+        if shard.count_of_offers > max_count_of_offers:
+            print(f"{shard} can not be split, only {max_count_of_offers} of its announcements will be parsed")
+        shards.append(shard)
+
+    parser.shard = None
+    print(f"The query is split into {len(shards)} shards: "
+          f"{sum(shard.count_of_offers for shard in shards)} announcements "
+          f"(offers on bounds of total area bands are counted in both)")
+    return shards
+
+
+def iter_shards(parser, create_parser, shards, workers: int = 4):
+    """Parse shards in a pool of threads and yield announcements, offers repeated in several shards are yielded once.
+
+    :param parser: parser of the whole query, its sink saves announcements of all shards
+    :param create_parser: function without arguments returning a parser of the same query without saving
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    records = queue.Queue()
+    parsed_offer_ids = set()
+    is_stopped = threading.Event()
+
+    def parse_shard(shard) -> None:
+        if is_stopped.is_set():
+            records.put(None)
+            return
+
+        shard_parser = create_parser()
+        shard_parser.shard = shard
+        shard_parser.result_parsed = parsed_offer_ids
+        try:
+            results = shard_parser.iter_results()
+            for record in results:
+                if is_stopped.is_set():
+                    results.close()
+                    break
+                records.put(record)
+        finally:
+            records.put(None)
+
+    yielded_offer_ids = set()
+    parser._open_sink()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(parse_shard, shard) for shard in shards]
+        count_of_running = len(futures)
+        while count_of_running > 0:
+            record = records.get()
+            if record is None:
+                count_of_running -= 1
+                continue
+
+            offer_id = define_id_url(record["link"])
+            if offer_id in yielded_offer_ids:
+                continue
+
+            yielded_offer_ids.add(offer_id)
+            if parser.is_saving_csv:
+                parser._save_results(record)
+            yield record
+
+        for future in futures:
+            future.result()
+    finally:
+        is_stopped.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        parser._close_sink()
+        parser.stats.dump()
+
+    print(f"\n\nThe collection of information from {len(shards)} shards is completed")
+    print(f"Total number of parsed announcements: {len(yielded_offer_ids)}")
+
+
+def _count_offers(parser, shard) -> int:
+    """Count of offers of the band by its first page, raises Exception if the page has cards but not their count."""
+    parser.shard = shard
+    url = parser._build_url(1)
+    for attempt_number in range(1, 4):
+        try:
+            html = parser._get(url)
+            document = make_document(html, parser.parser_backend)
+            if 'Captcha' in document.text:
+                parser.stats.increment("captchas")
+                raise Exception('Captcha')
+            break
+        except Exception as exc:
+            parser.stats.increment("retries")
+            print(f"\n\nException: {exc}")
+            parser.rate_limiter.report_throttling()
+            if parser.response_cache is not None:
+                parser.response_cache.delete(url)
+            print(f'Retrying. Attempt number {attempt_number}')
+    else:
+        raise Exception('Couldn\'t parse cian.ru')
+
+    count_of_offers = define_count_of_offers(html, document)
+    if count_of_offers == -1:
+        if len(document.select("article[data-name='CardComponent']")) == 0:
+            return 0
+        raise Exception(f'The count of announcements of {shard} is not found on its first page, '
+                        f'the query can not be split into shards')
+    return count_of_offers
+
+
+def _split_band(lower, upper, limit, is_overlapping=False):
+    """Halves of band [lower, upper] split in the geometric middle, an unbounded band is cut at limit first.
+
+    Prices are whole rubles, so the upper half starts after the middle. Areas are fractional, so with
+    is_overlapping the upper half starts at the middle: an area between two whole numbers is in one of the halves,
+    offers on the bound are in both and are yielded once. None if the band can not be split.
+    """
+    step = 0 if is_overlapping else 1
+    lower_value = lower or 0
+    if upper is None:
+        cut = max(limit, lower_value * 2)
+        return (lower, cut), (cut + step, None)
+
+    if upper <= lower_value + 1 - step:
+        return None
+
+    middle = int(math.sqrt(max(lower_value, 1) * upper))
+    middle = min(max(middle, lower_value + 1 - step), upper - 1)
+    return (lower, middle), (middle + step, upper)
@@ -0,0 +1,309 @@
+import csv
+import os
+import sqlite3
+import time
+
+from cianparser.constants import FIELDS_OF_OFFER, LATIN_FIELDS, TYPES_OF_FIELDS
+from cianparser.helpers import define_id_url, transliterate_to_latin
+
+
+class CsvSink:
+    """Append-only csv writer: header is written once, every record is appended as it is parsed."""
+
+    def __init__(self, file_path, fieldnames, flush_every: int = 1):
+        self.file_path = file_path
+        self.fieldnames = list(fieldnames)
+        self.flush_every = flush_every
+        self.count_written = 0
+        self._file = None
+        self._writer = None
+
+    def open(self) -> None:
+        is_new_file = not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == 0
+        self._file = open(self.file_path, 'a', newline='')
+        self._writer = csv.DictWriter(self._file, self.fieldnames, delimiter=';', restval='', extrasaction='ignore')
+        if is_new_file:
+            self._writer.writeheader()
+
+    def write(self, record: dict) -> None:
+        if self._file is None:
+            self.open()
+
+        self._writer.writerow(record)
+        self.count_written += 1
+        if self.flush_every and self.count_written % self.flush_every == 0:
+            self._file.flush()
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def truncate(self, size: int) -> None:
+        """Drop what was written after size bytes, e.g. by an interrupted crawl after its last checkpoint."""
+        if os.path.exists(self.file_path) and os.path.getsize(self.file_path) > size:
+            os.truncate(self.file_path, size)
+
+    @property
+    def bytes_written(self) -> int:
+        if self._file is not None:
+            return self._file.tell()
+        if os.path.exists(self.file_path):
+            return os.path.getsize(self.file_path)
+        return 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ParquetSink:
+    """Parquet writer with a typed schema: records are buffered and written by row groups of row_group_size.
+
+    Values -1 and "" used by extractors for missing data are written as nulls. Requires pyarrow.
+    """
+
+    def __init__(self, file_path, fieldnames, row_group_size: int = 10000, compression: str = 'zstd'):
+        self.file_path = file_path
+        self.fieldnames = list(fieldnames)
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.count_written = 0
+        self._columns = {fieldname: [] for fieldname in self.fieldnames}
+        self._count_buffered = 0
+        self._writer = None
+        self._schema = None
+
+    def open(self) -> None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Saving to parquet requires pyarrow. Install it: pip install pyarrow')
+
+        arrow_types = {int: pyarrow.int64(), float: pyarrow.float64(), str: pyarrow.string()}
+        self._schema = pyarrow.schema(
+            [(fieldname, arrow_types[TYPES_OF_FIELDS.get(fieldname, str)]) for fieldname in self.fieldnames]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(str(self.file_path), self._schema, compression=self.compression)
+
+    def write(self, record: dict) -> None:
+        if self._writer is None:
+            self.open()
+
+        for fieldname, column in self._columns.items():
+            column.append(_to_type(record.get(fieldname), TYPES_OF_FIELDS.get(fieldname, str)))
+        self._count_buffered += 1
+        self.count_written += 1
+        if self._count_buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._writer is None or self._count_buffered == 0:
+            return
+
+        import pyarrow
+
+        self._writer.write_table(pyarrow.Table.from_pydict(self._columns, schema=self._schema))
+        for column in self._columns.values():
+            column.clear()
+        self._count_buffered = 0
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+
+    @property
+    def bytes_written(self) -> int:
+        if os.path.exists(self.file_path):
+            return os.path.getsize(self.file_path)
+        return 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SqliteSink:
+    """Sqlite table of offers keyed by offer id, which is updated by every run instead of being written anew.
+
+    Records are upserted in transactions of batch_size. Table price_history gets a row when an offer
+    is seen for the first time and every time its price changes.
+    """
+
+    PRICE_FIELDS = ("price", "price_per_month", "price_per_day")
+    INDEXED_FIELDS = ("city", "rooms_count") + PRICE_FIELDS
+    SQL_TYPES = {int: "INTEGER", float: "REAL", str: "TEXT"}
+
+    def __init__(self, file_path, fieldnames=FIELDS_OF_OFFER, batch_size: int = 1000):
+        self.file_path = file_path
+        self.fieldnames = list(fieldnames)
+        self.batch_size = batch_size
+        self.count_written = 0
+        self._batch = dict()
+        self._connection = None
+
+    def open(self) -> None:
+        self._connection = sqlite3.connect(str(self.file_path))
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(
+            f"{fieldname} {self.SQL_TYPES[TYPES_OF_FIELDS.get(fieldname, str)]}" for fieldname in self.fieldnames
+        )
+        with self._connection:
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS offers (offer_id TEXT PRIMARY KEY, {columns}, first_seen REAL, last_seen REAL)"
+            )
+            existing_columns = {row[1] for row in self._connection.execute("PRAGMA table_info(offers)")}
+            for fieldname in self.fieldnames:
+                if fieldname not in existing_columns:
+                    sql_type = self.SQL_TYPES[TYPES_OF_FIELDS.get(fieldname, str)]
+                    self._connection.execute(f"ALTER TABLE offers ADD COLUMN {fieldname} {sql_type}")
+            for fieldname in self.INDEXED_FIELDS:
+                if fieldname in self.fieldnames:
+                    self._connection.execute(f"CREATE INDEX IF NOT EXISTS offers_{fieldname} ON offers ({fieldname})")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS price_history (offer_id TEXT, price INTEGER, observed REAL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS price_history_offer_id ON price_history (offer_id)")
+
+        placeholders = ", ".join("?" * (len(self.fieldnames) + 3))
+        updates = ", ".join(f"{fieldname} = excluded.{fieldname}" for fieldname in self.fieldnames)
+        self._upsert_sql = (
+            f"INSERT INTO offers (offer_id, {', '.join(self.fieldnames)}, first_seen, last_seen) "
+            f"VALUES ({placeholders}) ON CONFLICT (offer_id) DO UPDATE SET {updates}, last_seen = excluded.last_seen"
+        )
+        self._price_fields = [fieldname for fieldname in self.PRICE_FIELDS if fieldname in self.fieldnames]
+        price = f"COALESCE({', '.join(self._price_fields)}, NULL)" if self._price_fields else "NULL"
+        self._history_sql = (
+            "INSERT INTO price_history (offer_id, price, observed) SELECT ?, ?, ? WHERE NOT EXISTS "
+            f"(SELECT 1 FROM offers WHERE offer_id = ? AND {price} IS ?)"
+        )
+
+    def write(self, record: dict) -> None:
+        if self._connection is None:
+            self.open()
+
+        self._batch[define_id_url(record["link"])] = record
+        self.count_written += 1
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._connection is None or not self._batch:
+            return
+
+        now = time.time()
+        rows = []
+        history_rows = []
+        for offer_id, record in self._batch.items():
+            values = [_to_type(record.get(fieldname), TYPES_OF_FIELDS.get(fieldname, str))
+                      for fieldname in self.fieldnames]
+            rows.append((offer_id, *values, now, now))
+            prices = [_to_type(record.get(fieldname), int) for fieldname in self._price_fields]
+            price = next((price for price in prices if price is not None), None)
+            history_rows.append((offer_id, price, now, offer_id, price))
+
+        with self._connection:
+            self._connection.executemany(self._history_sql, history_rows)
+            self._connection.executemany(self._upsert_sql, rows)
+        self._batch.clear()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+
+    @property
+    def bytes_written(self) -> int:
+        if os.path.exists(self.file_path):
+            return os.path.getsize(self.file_path)
+        return 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class LatinSink:
+    """Wraps another sink: text fields of records are transliterated to latin by batches before writing them.
+
+    Every distinct value of a batch is transliterated once, parsed records themselves stay in cyrillic.
+    """
+
+    def __init__(self, sink, batch_size: int = 1000):
+        self.sink = sink
+        self.batch_size = batch_size
+        self._batch = []
+
+    @property
+    def file_path(self):
+        return self.sink.file_path
+
+    @property
+    def count_written(self) -> int:
+        return self.sink.count_written + len(self._batch)
+
+    def open(self) -> None:
+        self.sink.open()
+
+    def write(self, record) -> None:
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._batch:
+            values = {record.get(field) for record in self._batch for field in LATIN_FIELDS}
+            latin_values = {value: transliterate_to_latin(value) for value in values if value}
+            for record in self._batch:
+                latin_record = dict(record)
+                for field in LATIN_FIELDS:
+                    if latin_record.get(field):
+                        latin_record[field] = latin_values[latin_record[field]]
+                self.sink.write(latin_record)
+            self._batch.clear()
+        self.sink.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self.sink.close()
+
+    @property
+    def bytes_written(self) -> int:
+        return self.sink.bytes_written
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _to_type(value, field_type):
+    if value is None or value == -1 or value == '':
+        return None
+    if field_type is str:
+        return str(value)
+    try:
+        return field_type(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,128 @@
+import bisect
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+
+STAGES = (
+    "listing_fetch",
+    "listing_parse",
+    "card_extraction",
+    "offer_fetch",
+    "offer_parse",
+    "transliteration",
+    "sink_write",
+    "rate_limit_wait",
+)
+COUNTERS = ("requests", "bytes", "cache_hits", "retries", "captchas")
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, math.inf)
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class Histogram:
+    """Latencies in seconds counted by LATENCY_BUCKETS, like a prometheus histogram, so memory does not grow."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def percentile(self, quantile: float) -> float:
+        """Estimate of percentile by linear interpolation inside the bucket, as histogram_quantile does."""
+        if self.count == 0:
+            return 0.0
+
+        rank = quantile * self.count
+        cumulative_count = 0
+        for ind, bucket_count in enumerate(self.bucket_counts):
+            if cumulative_count + bucket_count >= rank and bucket_count > 0:
+                lower_bound = LATENCY_BUCKETS[ind - 1] if ind > 0 else 0.0
+                upper_bound = LATENCY_BUCKETS[ind]
+                if upper_bound == math.inf:
+                    return lower_bound
+                return lower_bound + (upper_bound - lower_bound) * (rank - cumulative_count) / bucket_count
+            cumulative_count += bucket_count
+        return LATENCY_BUCKETS[-2]
+
+
+class CrawlStats:
+    """Counters and per-stage latency histograms of a crawl, they may be shared by several parsers and threads.
+
+    If path is given, stats are dumped there at the end of the crawl: in prometheus textfile format
+    when path ends with ".prom", otherwise as json.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.histograms = {stage: Histogram() for stage in STAGES}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.histograms[stage].observe(seconds)
+
+    def increment(self, counter: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += value
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "stages": {
+                    stage: {
+                        "count": histogram.count,
+                        "seconds": histogram.sum,
+                        **{f"p{int(quantile * 100)}": histogram.percentile(quantile) for quantile in PERCENTILES},
+                    }
+                    for stage, histogram in self.histograms.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for counter, value in self.counters.items():
+                lines.append(f"# TYPE cianparser_{counter}_total counter")
+                lines.append(f"cianparser_{counter}_total {value}")
+
+            lines.append("# TYPE cianparser_stage_seconds histogram")
+            for stage, histogram in self.histograms.items():
+                cumulative_count = 0
+                for upper_bound, bucket_count in zip(LATENCY_BUCKETS, histogram.bucket_counts):
+                    cumulative_count += bucket_count
+                    le = "+Inf" if upper_bound == math.inf else repr(upper_bound)
+                    lines.append(f'cianparser_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative_count}')
+                lines.append(f'cianparser_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'cianparser_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path=None) -> None:
+        path = path or self.path
+        if path is None:
+            return
+
+        if str(path).endswith(".prom"):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), indent=2)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(temporary_path, path)
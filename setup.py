@@ -28,4 +28,9 @@ setup(
         'lxml',
         # 'datetime',
     ],
+    extras_require={
+        'async': ['aiohttp'],
+        'selectolax': ['selectolax'],
+        'parquet': ['pyarrow'],
+    },
 )